@@ -109,6 +109,31 @@ class BenchMessage:
         TestRepeatedMessage().parse(self.instance_filled_repeated_bytes)
 
 
+class BenchVarint:
+    """Test encoding and decoding varints of each encoded size."""
+
+    params = list(range(1, 11))
+    param_names = ["encoded_size"]
+
+    def setup(self, encoded_size):
+        # The smallest value taking up `encoded_size` bytes
+        self.value = 1 << 7 * (encoded_size - 1)
+        self.encoded = betterproto.encode_varint(self.value)
+        assert len(self.encoded) == encoded_size
+
+    def time_encode_varint(self, encoded_size):
+        """Time encoding a varint."""
+        betterproto.encode_varint(self.value)
+
+    def time_decode_varint(self, encoded_size):
+        """Time decoding a varint."""
+        betterproto.decode_varint(self.encoded, 0)
+
+    def time_encode_zigzag_varint(self, encoded_size):
+        """Time encoding a sint64 varint."""
+        betterproto.encode_varint(betterproto.encode_zigzag(-self.value))
+
+
 class MemSuite:
     def setup(self):
         self.cls = TestMessage
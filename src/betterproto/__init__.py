@@ -21,14 +21,22 @@ from datetime import (
 )
 from io import BytesIO
 from itertools import count
+from types import (
+    MappingProxyType,
+    MemberDescriptorType,
+)
 from typing import (
     TYPE_CHECKING,
+    AbstractSet,
     Any,
     Callable,
     ClassVar,
     Dict,
+    FrozenSet,
     Generator,
     Iterable,
+    Iterator,
+    List,
     Mapping,
     Optional,
     Set,
@@ -57,11 +65,16 @@ from .utils import (
 
 
 if TYPE_CHECKING:
+    import asyncio
+
     from _typeshed import (
+        ReadableBuffer,
         SupportsRead,
         SupportsWrite,
     )
 
+    from .stream import MessageWriter
+
 
 # Proto 3 data types
 TYPE_ENUM = "enum"
@@ -335,29 +348,49 @@ def _pack_fmt(proto_type: str) -> str:
     }[proto_type]
 
 
+# The encodings of all varints below 2 ** 14, which fit in one or two bytes.
+_VARINT_TABLE: Tuple[bytes, ...] = tuple(
+    bytes((value,)) if value < 0x80 else bytes((value & 0x7F | 0x80, value >> 7))
+    for value in range(1 << 14)
+)
+
+
 def dump_varint(value: int, stream: "SupportsWrite[bytes]") -> None:
     """Encodes a single varint and dumps it into the provided stream."""
-    if value < -(1 << 63):
-        raise ValueError(
-            "Negative value is not representable as a 64-bit integer - unable to encode a varint within 10 bytes."
-        )
+    stream.write(encode_varint(value))
+
+
+def encode_varint(value: int) -> bytes:
+    """Encodes a single varint value for serialization."""
+    if 0 <= value < 1 << 14:
+        return _VARINT_TABLE[value]
     elif value < 0:
+        if value < -(1 << 63):
+            raise ValueError(
+                "Negative value is not representable as a 64-bit integer - unable to encode a varint within 10 bytes."
+            )
         value += 1 << 64
 
-    bits = value & 0x7F
-    value >>= 7
-    while value:
-        stream.write((0x80 | bits).to_bytes(1, "little"))
-        bits = value & 0x7F
+    output = bytearray()
+    while value > 0x7F:
+        output.append(value & 0x7F | 0x80)
         value >>= 7
-    stream.write(bits.to_bytes(1, "little"))
+    output.append(value)
+    return bytes(output)
 
 
-def encode_varint(value: int) -> bytes:
-    """Encodes a single varint value for serialization."""
-    with BytesIO() as stream:
-        dump_varint(value, stream)
-        return stream.getvalue()
+def encode_zigzag(value: int) -> int:
+    """
+    Maps a signed integer to an unsigned one with the zig-zag encoding used by
+    ``sint32`` and ``sint64`` fields, so that small negative values are encoded as
+    short varints.
+    """
+    return value << 1 if value >= 0 else (value << 1) ^ -1
+
+
+def decode_zigzag(value: int) -> int:
+    """Maps a zig-zag encoded unsigned integer back to the signed integer."""
+    return (value >> 1) ^ -(value & 1)
 
 
 def size_varint(value: int) -> int:
@@ -386,8 +419,7 @@ def _preprocess_single(proto_type: str, wraps: str, value: Any) -> bytes:
     ):
         return encode_varint(value)
     elif proto_type in (TYPE_SINT32, TYPE_SINT64):
-        # Handle zig-zag encoding.
-        return encode_varint(value << 1 if value >= 0 else (value << 1) ^ (~0))
+        return encode_varint(encode_zigzag(value))
     elif proto_type in FIXED_TYPES:
         return struct.pack(_pack_fmt(proto_type), value)
     elif proto_type == TYPE_STRING:
@@ -409,41 +441,6 @@ def _preprocess_single(proto_type: str, wraps: str, value: Any) -> bytes:
     return value
 
 
-def _len_preprocessed_single(proto_type: str, wraps: str, value: Any) -> int:
-    """Calculate the size of adjusted values for serialization without fully serializing them."""
-    if proto_type in (
-        TYPE_ENUM,
-        TYPE_BOOL,
-        TYPE_INT32,
-        TYPE_INT64,
-        TYPE_UINT32,
-        TYPE_UINT64,
-    ):
-        return size_varint(value)
-    elif proto_type in (TYPE_SINT32, TYPE_SINT64):
-        # Handle zig-zag encoding.
-        return size_varint(value << 1 if value >= 0 else (value << 1) ^ (~0))
-    elif proto_type in FIXED_TYPES:
-        return len(struct.pack(_pack_fmt(proto_type), value))
-    elif proto_type == TYPE_STRING:
-        return len(value.encode("utf-8"))
-    elif proto_type == TYPE_MESSAGE:
-        if isinstance(value, datetime):
-            # Convert the `datetime` to a timestamp message.
-            value = _Timestamp.from_datetime(value)
-        elif isinstance(value, timedelta):
-            # Convert the `timedelta` to a duration message.
-            value = _Duration.from_timedelta(value)
-        elif wraps:
-            if value is None:
-                return 0
-            value = _get_wrapper(wraps)(value=value)
-
-        return len(bytes(value))
-
-    return len(value)
-
-
 def _serialize_single(
     field_number: int,
     proto_type: str,
@@ -475,31 +472,6 @@ def _serialize_single(
     return bytes(output)
 
 
-def _len_single(
-    field_number: int,
-    proto_type: str,
-    value: Any,
-    *,
-    serialize_empty: bool = False,
-    wraps: str = "",
-) -> int:
-    """Calculates the size of a serialized single field and value."""
-    size = _len_preprocessed_single(proto_type, wraps, value)
-    if proto_type in WIRE_VARINT_TYPES:
-        size += size_varint(field_number << 3)
-    elif proto_type in WIRE_FIXED_32_TYPES:
-        size += size_varint((field_number << 3) | 5)
-    elif proto_type in WIRE_FIXED_64_TYPES:
-        size += size_varint((field_number << 3) | 1)
-    elif proto_type in WIRE_LEN_DELIM_TYPES:
-        if size or serialize_empty or wraps:
-            size += size_varint((field_number << 3) | 2) + size_varint(size)
-    else:
-        raise NotImplementedError(proto_type)
-
-    return size
-
-
 def _parse_float(value: Any) -> float:
     """Parse the given value to a float
 
@@ -563,15 +535,63 @@ def load_varint(stream: "SupportsRead[bytes]") -> Tuple[int, bytes]:
             return result, raw
 
 
+async def _load_varint_async(reader: "asyncio.StreamReader") -> Optional[int]:
+    """
+    Load a single varint value from an asyncio stream. Returns ``None`` if the
+    stream ended before the varint.
+    """
+    result = 0
+    for shift in range(0, 64, 7):
+        try:
+            b = (await reader.readexactly(1))[0]
+        except EOFError:  # asyncio.IncompleteReadError
+            if shift == 0:
+                return None
+            raise EOFError(
+                "Stream ended unexpectedly while attempting to load varint."
+            ) from None
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result
+    raise ValueError("Too many bytes when decoding varint.")
+
+
+async def _read_exactly_async(reader: "asyncio.StreamReader", size: int) -> bytes:
+    try:
+        return await reader.readexactly(size)
+    except EOFError as e:  # asyncio.IncompleteReadError
+        raise ValueError(
+            f"Expected message of size {size}, but was only able to "
+            f"read {len(e.partial)} bytes - the stream may have ended too "
+            "soon, or the expected size may have been incorrect."
+        ) from None
+
+
 def decode_varint(buffer: bytes, pos: int) -> Tuple[int, int]:
     """
     Decode a single varint value from a byte buffer. Returns the value and the
     new position in the buffer.
     """
-    with BytesIO(buffer) as stream:
-        stream.seek(pos)
-        value, raw = load_varint(stream)
-    return value, pos + len(raw)
+    try:
+        result = buffer[pos]
+        if result < 0x80:
+            return result, pos + 1
+        b = buffer[pos + 1]
+        if b < 0x80:
+            return (result & 0x7F) | (b << 7), pos + 2
+        result = (result & 0x7F) | ((b & 0x7F) << 7)
+        pos += 2
+        for shift in range(14, 64, 7):
+            b = buffer[pos]
+            pos += 1
+            result |= (b & 0x7F) << shift
+            if b < 0x80:
+                return result, pos
+    except IndexError:
+        raise EOFError(
+            "Buffer ended unexpectedly while attempting to decode varint."
+        ) from None
+    raise ValueError("Too many bytes when decoding varint.")
 
 
 @dataclasses.dataclass(frozen=True)
@@ -585,54 +605,245 @@ class ParsedField:
 def load_fields(stream: "SupportsRead[bytes]") -> Generator[ParsedField, None, None]:
     while True:
         try:
-            num_wire, raw = load_varint(stream)
+            num_wire, tag = load_varint(stream)
         except EOFError:
             return
         number = num_wire >> 3
         wire_type = num_wire & 0x7
 
         decoded: Any = None
+        raw = tag
         if wire_type == WIRE_VARINT:
             decoded, r = load_varint(stream)
-            raw += r
+            raw = tag + r
         elif wire_type == WIRE_FIXED_64:
             decoded = stream.read(8)
-            raw += decoded
+            raw = tag + decoded
         elif wire_type == WIRE_LEN_DELIM:
             length, r = load_varint(stream)
             decoded = stream.read(length)
-            raw += r
-            raw += decoded
+            raw = b"".join((tag, r, decoded))
         elif wire_type == WIRE_FIXED_32:
             decoded = stream.read(4)
-            raw += decoded
+            raw = tag + decoded
 
         yield ParsedField(number=number, wire_type=wire_type, value=decoded, raw=raw)
 
 
-def parse_fields(value: bytes) -> Generator[ParsedField, None, None]:
-    i = 0
-    while i < len(value):
-        start = i
-        num_wire, i = decode_varint(value, i)
-        number = num_wire >> 3
-        wire_type = num_wire & 0x7
-
-        decoded: Any = None
+def _field_offsets(
+    data: bytes, pos: int, end: int
+) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    Yields the tag of each field encoded in ``data[pos:end]``, with the positions
+    just after the tag, of the start of the value (after the length prefix of
+    length-delimited values) and of the end of the value. No part of the data is
+    copied.
+    """
+    while pos < end:
+        tag, pos = decode_varint(data, pos)
+        wire_type = tag & 0x7
+        value_pos = start = pos
         if wire_type == WIRE_VARINT:
-            decoded, i = decode_varint(value, i)
+            pos = decode_varint(data, pos)[1]
         elif wire_type == WIRE_FIXED_64:
-            decoded, i = value[i : i + 8], i + 8
+            pos += 8
         elif wire_type == WIRE_LEN_DELIM:
-            length, i = decode_varint(value, i)
-            decoded = value[i : i + length]
-            i += length
+            length, start = decode_varint(data, pos)
+            pos = start + length
         elif wire_type == WIRE_FIXED_32:
-            decoded, i = value[i : i + 4], i + 4
+            pos += 4
+        yield tag, value_pos, start, pos
+
+
+def parse_fields(value: bytes) -> Generator[ParsedField, None, None]:
+    start = 0
+    for tag, value_pos, value_start, end in _field_offsets(value, 0, len(value)):
+        wire_type = tag & 0x7
+        if wire_type == WIRE_VARINT:
+            decoded: Any = decode_varint(value, value_pos)[0]
+        elif wire_type in (WIRE_FIXED_64, WIRE_LEN_DELIM, WIRE_FIXED_32):
+            decoded = value[value_start:end]
+        else:
+            decoded = None
 
         yield ParsedField(
-            number=number, wire_type=wire_type, value=decoded, raw=value[start:i]
+            number=tag >> 3, wire_type=wire_type, value=decoded, raw=value[start:end]
         )
+        start = end
+
+
+class UnknownFields:
+    """
+    The fields of an encoded message that are not known by the message class it
+    was parsed with, e.g. because it was encoded with a newer version of the
+    schema. Get the unknown fields of a message with :func:`unknown_fields`.
+
+    Each field is kept, in order, as a copy of its encoding (or as a slice of the
+    parsed data when parsing with ``zero_copy``), and the fields are only joined
+    when the message is serialized again, so that a message with many unknown
+    fields is parsed in linear time.
+
+    .. container:: operations
+
+        .. describe:: bytes(x)
+
+            Returns the encoded fields, joined.
+
+        .. describe:: len(x)
+
+            Returns the length in bytes of the encoded fields.
+
+        .. describe:: iter(x)
+
+            Returns an iterator over the :class:`ParsedField` of each field.
+
+        .. describe:: number in x
+
+            Whether a field with the given number is present.
+
+        .. describe:: x += y
+
+            Appends the encoded fields of other unknown fields or of bytes.
+
+        .. describe:: x + y
+
+            Returns new unknown fields with the fields of both operands.
+
+        .. describe:: x == y
+
+            Compares the encoded fields with other unknown fields or with bytes.
+
+    Parameters
+    -----------
+    data: Union[:class:`bytes`, :class:`bytearray`, :class:`memoryview`]
+        The encoded fields to start with.
+    """
+
+    __slots__ = ("_numbers", "_chunks", "_joined")
+
+    def __init__(self, data: "ReadableBuffer" = b"") -> None:
+        self._numbers: List[int] = []
+        self._chunks: List["ReadableBuffer"] = []
+        self._joined: Optional[bytes] = None
+        if data:
+            self += data
+
+    def _append(self, number: int, raw: "ReadableBuffer") -> None:
+        self._numbers.append(number)
+        self._chunks.append(raw)
+        self._joined = None
+
+    def __iadd__(self, other: Union[UnknownFields, "ReadableBuffer"]) -> UnknownFields:
+        if isinstance(other, UnknownFields):
+            for number, raw in zip(other._numbers, other._chunks):
+                self._append(number, raw)
+        else:
+            for field in parse_fields(other):
+                self._append(field.number, bytes(field.raw))
+        return self
+
+    def __add__(self, other: Union[UnknownFields, "ReadableBuffer"]) -> UnknownFields:
+        fields = UnknownFields()
+        fields += self
+        fields += other
+        return fields
+
+    def __bytes__(self) -> bytes:
+        if self._joined is None:
+            self._joined = b"".join(self._chunks)
+        return self._joined
+
+    def __len__(self) -> int:
+        if self._joined is not None:
+            return len(self._joined)
+        return sum(map(len, self._chunks))
+
+    def __bool__(self) -> bool:
+        return bool(self._chunks)
+
+    def __iter__(self) -> Iterator[ParsedField]:
+        for raw in self._chunks:
+            yield from parse_fields(raw)
+
+    def __contains__(self, number: object) -> bool:
+        return number in self._numbers
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (UnknownFields, bytes, bytearray, memoryview)):
+            return bytes(self) == bytes(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({bytes(self)!r})"
+
+    def get(self, number: int) -> List[ParsedField]:
+        """
+        Get the unknown fields with a field number.
+
+        Parameters
+        -----------
+        number: :class:`int`
+            The field number.
+
+        Returns
+        --------
+        List[:class:`ParsedField`]
+            The fields with the number, in order. A repeated field can be present
+            multiple times.
+        """
+        return [
+            field
+            for field_number, raw in zip(self._numbers, self._chunks)
+            if field_number == number
+            for field in parse_fields(raw)
+        ]
+
+
+@dataclasses.dataclass(frozen=True)
+class FieldPlan:
+    """
+    The precomputed plan for encoding and decoding a single field of a message
+    class.
+    """
+
+    # Name of the field on the message class
+    name: str
+    # Protobuf field number
+    number: int
+    # Protobuf type name
+    proto_type: str
+    # Wire type of a single (non-packed) value
+    wire_type: int
+    # The encoded tag of a single (non-packed) value
+    tag: bytes
+    # Is the field repeated
+    repeated: bool
+    # Are the values of the repeated field packed in a length-delimited field
+    packed: bool
+    # Encodes a single value (or a key/value pair for maps), including its tag
+    encode: Callable[[Any], bytes] = dataclasses.field(repr=False, compare=False)
+    # Decodes a single value (or a key/value pair for maps) from the buffer at the
+    # given position, just after its tag. Returns the value and the position after
+    # it.
+    decode: Callable[[bytes, int], Tuple[Any, int]] = dataclasses.field(
+        repr=False, compare=False
+    )
+
+
+@dataclasses.dataclass(frozen=True)
+class MessagePlan:
+    """
+    The read-only plan used to encode and decode a message class, with a
+    :class:`FieldPlan` for each field. Get it with :func:`message_plan`.
+    """
+
+    cls: Type["Message"]
+    # The plans of the fields, ordered by field number
+    fields: Tuple[FieldPlan, ...]
+    by_name: Mapping[str, FieldPlan] = dataclasses.field(repr=False, compare=False)
+    by_number: Mapping[int, FieldPlan] = dataclasses.field(repr=False, compare=False)
 
 
 class ProtoClassMetadata:
@@ -644,6 +855,14 @@ class ProtoClassMetadata:
         "field_name_by_number",
         "meta_by_field_name",
         "sorted_field_names",
+        "slots",
+        "cls",
+        "_plan",
+        "_encoder",
+        "_sizer",
+        "_decoder",
+        "_decoders",
+        "_post_init",
     )
 
     oneof_group_by_field: Dict[str, str]
@@ -653,6 +872,8 @@ class ProtoClassMetadata:
     sorted_field_names: Tuple[str, ...]
     default_gen: Dict[str, Callable[[], Any]]
     cls_by_field: Dict[str, Type]
+    slots: Optional[Dict[str, MemberDescriptorType]]
+    cls: Type["Message"]
 
     def __init__(self, cls: Type["Message"]):
         by_field = {}
@@ -660,60 +881,1570 @@ class ProtoClassMetadata:
         by_field_name = {}
         by_field_number = {}
 
-        fields = dataclasses.fields(cls)
-        for field in fields:
-            meta = FieldMetadata.get(field)
+        fields = dataclasses.fields(cls)
+        for field in fields:
+            meta = FieldMetadata.get(field)
+
+            if meta.group:
+                # This is part of a one-of group.
+                by_field[field.name] = meta.group
+
+                by_group.setdefault(meta.group, set()).add(field)
+
+            by_field_name[field.name] = meta
+            by_field_number[meta.number] = field.name
+
+        self.oneof_group_by_field = by_field
+        self.oneof_field_by_group = by_group
+        self.field_name_by_number = by_field_number
+        self.meta_by_field_name = by_field_name
+        self.sorted_field_names = tuple(
+            by_field_number[number] for number in sorted(by_field_number)
+        )
+        self.default_gen = self._get_default_gen(cls, fields)
+        self.cls_by_field = self._get_cls_by_field(cls, fields)
+        # Messages of classes with ``__slots__`` store their fields in the slots.
+        self.slots = self._get_slots(cls, fields) if not cls.__dictoffset__ else None
+        self.cls = cls
+        self._decoders: Dict[
+            Tuple[bool, bool, Optional[FrozenSet[str]], bool], Callable[..., None]
+        ] = {}
+
+    @property
+    def plan(self) -> MessagePlan:
+        """
+        The encoding plan of this class. It is compiled the first time it is needed.
+        """
+        try:
+            return self._plan
+        except AttributeError:
+            self._plan = plan = _compile_plan(self)
+            return plan
+
+    @property
+    def encoder(self) -> Callable[["Message", bytearray, Dict[int, int]], None]:
+        """
+        The serializer specialized for this class. It is compiled the first time a
+        message of this class is serialized.
+        """
+        try:
+            return self._encoder
+        except AttributeError:
+            self._encoder = encoder = _compile_encoder(self)
+            return encoder
+
+    @property
+    def sizer(self) -> Callable[["Message", Dict[int, int]], int]:
+        """
+        The function computing the encoded size of messages of this class. It is
+        compiled the first time it is needed.
+        """
+        try:
+            return self._sizer
+        except AttributeError:
+            self._sizer = sizer = _compile_sizer(self)
+            return sizer
+
+    @property
+    def decoder(self) -> Callable[["Message", bytes, int, int], None]:
+        """
+        The parser specialized for this class. It is compiled the first time a
+        message of this class is parsed.
+        """
+        try:
+            return self._decoder
+        except AttributeError:
+            self._decoder = decoder = _compile_decoder(self)
+            return decoder
+
+    @property
+    def post_init(self) -> Callable[["Message"], None]:
+        """
+        The function initializing the state of a message of this class after its
+        fields are set, see :meth:`Message.__post_init__`. It is compiled the
+        first time it is needed.
+        """
+        try:
+            return self._post_init
+        except AttributeError:
+            self._post_init = post_init = _compile_post_init(self)
+            return post_init
+
+    def decoder_for(
+        self,
+        lazy: bool = False,
+        zero_copy: bool = False,
+        only: Optional[Iterable[str]] = None,
+        keep_skipped: bool = False,
+    ) -> Callable[["Message", bytes, int, int], None]:
+        """
+        The parser specialized for this class with the given options of
+        :meth:`Message.parse`. It is compiled the first time it is needed for a set
+        of options.
+        """
+        if not (lazy or zero_copy or only is not None):
+            return self.decoder
+
+        key = (lazy, zero_copy, None if only is None else frozenset(only), keep_skipped)
+        try:
+            return self._decoders[key]
+        except KeyError:
+            decoder = self._decoders[key] = _compile_decoder(self, *key)
+            return decoder
+
+    @staticmethod
+    def _get_default_gen(
+        cls: Type["Message"], fields: Iterable[dataclasses.Field]
+    ) -> Dict[str, Callable[[], Any]]:
+        return {field.name: cls._get_field_default_gen(field) for field in fields}
+
+    @staticmethod
+    def _get_slots(
+        cls: Type["Message"], fields: Iterable[dataclasses.Field]
+    ) -> Dict[str, MemberDescriptorType]:
+        slots = {}
+        for field in fields:
+            for base in cls.__mro__:
+                slot = base.__dict__.get(field.name)
+                if isinstance(slot, _SlotFieldDescriptor):
+                    # The descriptors of the fields are already installed.
+                    slot = slot.slot
+                if isinstance(slot, MemberDescriptorType):
+                    slots[field.name] = slot
+                    break
+            else:
+                raise TypeError(
+                    f"{cls.__name__} has __slots__ but no slot for the field "
+                    f"{field.name!r}"
+                )
+        return slots
+
+    @staticmethod
+    def _get_cls_by_field(
+        cls: Type["Message"], fields: Iterable[dataclasses.Field]
+    ) -> Dict[str, Type]:
+        field_cls = {}
+
+        for field in fields:
+            meta = FieldMetadata.get(field)
+            if meta.proto_type == TYPE_MAP:
+                assert meta.map_types
+                kt = cls._cls_for(field, index=0)
+                vt = cls._cls_for(field, index=1)
+                field_cls[field.name] = dataclasses.make_dataclass(
+                    "Entry",
+                    [
+                        ("key", kt, dataclass_field(1, meta.map_types[0])),
+                        ("value", vt, dataclass_field(2, meta.map_types[1])),
+                    ],
+                    bases=(Message,),
+                )
+                field_cls[f"{field.name}.value"] = vt
+            else:
+                field_cls[field.name] = cls._cls_for(field)
+
+        return field_cls
+
+
+def _serialize_field(
+    message: "Message", field_name: str, meta: FieldMetadata, value: Any
+) -> bytes:
+    """
+    Serializes a single field of a message, dispatching on the runtime type of the
+    value. The compiled serializers fall back to this for values they have no
+    specialized path for.
+    """
+    if value is None:
+        # Optional items should be skipped. This is used for the Google
+        # wrapper types and proto3 field presence/optional fields.
+        return b""
+
+    # Being selected in a a group means this field is the one that is
+    # currently set in a `oneof` group, so it must be serialized even
+    # if the value is the default zero value.
+    #
+    # Note that proto3 field presence/optional fields are put in a
+    # synthetic single-item oneof by protoc, which helps us ensure we
+    # send the value even if the value is the default zero value.
+    selected_in_group = bool(meta.group) or meta.optional
+
+    # Empty messages can still be sent on the wire if they were
+    # set (or received empty).
+    serialize_empty = isinstance(value, Message) and value._serialized_on_wire
+
+    include_default_value_for_oneof = message._include_default_value_for_oneof(
+        field_name=field_name, meta=meta
+    )
+
+    if value == message._get_field_default(field_name) and not (
+        selected_in_group or serialize_empty or include_default_value_for_oneof
+    ):
+        # Default (zero) values are not serialized. Two exceptions are
+        # if this is the selected oneof item or if we know we have to
+        # serialize an empty message (i.e. zero value was explicitly
+        # set by the user).
+        return b""
+
+    output = bytearray()
+    if isinstance(value, list):
+        if meta.proto_type in PACKED_TYPES:
+            # Packed lists look like a length-delimited field. First,
+            # preprocess/encode each value into a buffer and then
+            # treat it like a field of raw bytes.
+            buf = bytearray()
+            for item in value:
+                buf += _preprocess_single(meta.proto_type, "", item)
+            output += _serialize_single(meta.number, TYPE_BYTES, buf)
+        else:
+            for item in value:
+                output += (
+                    _serialize_single(
+                        meta.number,
+                        meta.proto_type,
+                        item,
+                        wraps=meta.wraps or "",
+                        serialize_empty=True,
+                    )
+                    # if it's an empty message it still needs to be represented
+                    # as an item in the repeated list
+                    or b"\n\x00"
+                )
+
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            assert meta.map_types
+            sk = _serialize_single(1, meta.map_types[0], k)
+            sv = _serialize_single(2, meta.map_types[1], v)
+            output += _serialize_single(meta.number, meta.proto_type, sk + sv)
+    else:
+        # If we have an empty string and we're including the default value for
+        # a oneof, make sure we serialize it. This ensures that the byte string
+        # output isn't simply an empty string. This also ensures that round trip
+        # serialization will keep `which_one_of` calls consistent.
+        if isinstance(value, str) and value == "" and include_default_value_for_oneof:
+            serialize_empty = True
+
+        output += _serialize_single(
+            meta.number,
+            meta.proto_type,
+            value,
+            serialize_empty=serialize_empty or bool(selected_in_group),
+            wraps=meta.wraps or "",
+        )
+
+    return bytes(output)
+
+
+def _wire_type(proto_type: str) -> int:
+    """Returns the wire type a (non-packed) value of a proto type is encoded with."""
+    if proto_type in WIRE_VARINT_TYPES:
+        return WIRE_VARINT
+    elif proto_type in WIRE_FIXED_32_TYPES:
+        return WIRE_FIXED_32
+    elif proto_type in WIRE_FIXED_64_TYPES:
+        return WIRE_FIXED_64
+    return WIRE_LEN_DELIM
+
+
+def _indent(lines: List[str], level: int = 1) -> List[str]:
+    return [f"{'    ' * level}{line}" for line in lines]
+
+
+def _message_size(message: "Message", sizes: Dict[int, int]) -> int:
+    """
+    Returns the size of the encoded ``message``, computing it with the compiled
+    sizer unless it has already been computed during the current serialization.
+    """
+    key = id(message)
+    try:
+        return sizes[key]
+    except KeyError:
+        size = sizes[key] = type(message)._betterproto.sizer(message, sizes)
+        return size
+
+
+def _encode_scalar_lines(
+    proto_type: str,
+    value: str,
+    tag: Optional[bytes],
+    *,
+    out: str = "out",
+    skip_empty: bool = False,
+    sizing: bool = False,
+) -> List[str]:
+    """
+    Source lines appending the encoding of the scalar ``value`` to ``out``,
+    prefixed by ``tag`` unless it is ``None``. Empty length-delimited values are
+    omitted if ``skip_empty`` is set.
+
+    If ``sizing`` is set, the lines add the size of the encoding to ``out``
+    instead.
+    """
+    lines = []
+    if tag is not None:
+        lines.append(f"{out} += {len(tag)}" if sizing else f"{out} += {tag!r}")
+    if proto_type in FIXED_TYPES:
+        if sizing:
+            lines.append(f"{out} += {struct.calcsize(_pack_fmt(proto_type))}")
+        else:
+            lines.append(f"{out} += _pack_{proto_type}({value})")
+        return lines
+    elif proto_type in WIRE_VARINT_TYPES:
+        if proto_type in (TYPE_SINT32, TYPE_SINT64):
+            # Handle zig-zag encoding.
+            value = f"{value} << 1 if {value} >= 0 else ({value} << 1) ^ -1"
+        if sizing:
+            lines.append(f"{out} += _size_varint({value})")
+        else:
+            lines.append(f"{out} += _encode_varint({value})")
+        return lines
+
+    if sizing:
+        if proto_type == TYPE_STRING:
+            # Only non-ASCII strings need to be encoded to find their size.
+            prepare = [
+                f"b = len({value}) if {value}.isascii() "
+                f"else len({value}.encode('utf-8'))"
+            ]
+        else:
+            prepare = [f"b = len({value})"]
+        lines.append(f"{out} += _size_varint(b) + b")
+        value = "b"
+    else:
+        prepare = []
+        if proto_type == TYPE_STRING:
+            prepare.append(f"b = {value}.encode('utf-8')")
+            value = "b"
+        lines += [f"{out} += _encode_varint(len({value}))", f"{out} += {value}"]
+    if skip_empty:
+        return [*prepare, f"if {value}:", *_indent(lines)]
+    return prepare + lines
+
+
+def _encode_message_lines(
+    value: str, tag: bytes, *, out: str = "out", sizing: bool = False
+) -> List[str]:
+    """
+    Source lines appending the message ``value`` with its tag and length prefix to
+    ``out``, or adding its encoded size if ``sizing`` is set. The size of the
+    message is expected in ``m``.
+    """
+    if sizing:
+        return [f"{out} += {len(tag)} + _size_varint(m) + m"]
+    return [
+        f"{out} += {tag!r}",
+        f"{out} += _encode_varint(m)",
+        f"type({value})._betterproto.encoder({value}, {out}, sizes)",
+    ]
+
+
+def _encode_field_lines(
+    proto_meta: ProtoClassMetadata,
+    field_name: str,
+    meta: FieldMetadata,
+    namespace: Dict[str, Any],
+    sizing: bool = False,
+) -> List[str]:
+    """
+    Source lines serializing the value of a single field into ``out``, or adding
+    the size of its encoding to ``n`` if ``sizing`` is set.
+    """
+    proto_type = meta.proto_type
+    field_cls = proto_meta.cls_by_field[field_name]
+    field_plan = proto_meta.plan.by_name[field_name]
+    is_repeated = field_plan.repeated
+    is_plain_message = (
+        proto_type == TYPE_MESSAGE
+        and not meta.wraps
+        and isinstance(field_cls, type)
+        and issubclass(field_cls, Message)
+    )
+    tag = field_plan.tag
+    namespace[f"_meta_{field_name}"] = meta
+    out = "n" if sizing else "out"
+    fallback = f"_serialize_field(self, {field_name!r}, _meta_{field_name}, v)"
+    fallback = f"n += len({fallback})" if sizing else f"out += {fallback}"
+
+    def preprocessed(value: str, wraps: str, out: str, skip_empty: bool) -> List[str]:
+        lines = [f"b = _preprocess_single('message', {wraps!r}, {value})"]
+        write = _encode_scalar_lines(TYPE_BYTES, "b", tag, out=out, sizing=sizing)
+        if skip_empty:
+            return [*lines, "if b:", *_indent(write)]
+        return lines + write
+
+    def delimited(value: str, tag: bytes) -> List[str]:
+        # When sizing, ``value`` holds the size of the payload rather than the
+        # payload itself.
+        if sizing:
+            return [f"n += {len(tag)} + _size_varint({value}) + {value}"]
+        return _encode_scalar_lines(TYPE_BYTES, value, tag)
+
+    if proto_type == TYPE_MAP:
+        assert meta.map_types
+        key_type, value_type = meta.map_types
+        value_tag = encode_varint(2 << 3 | _wire_type(value_type))
+        if value_type == TYPE_MESSAGE:
+            value_lines = [
+                "if isinstance(x, Message):",
+                "    m = _message_size(x, sizes)",
+                "    if m:",
+                *_indent(
+                    _encode_message_lines("x", value_tag, out="e", sizing=sizing), 2
+                ),
+                "else:",
+                *_indent(preprocessed("x", "", "e", True)),
+            ]
+        else:
+            value_lines = _encode_scalar_lines(
+                value_type, "x", value_tag, out="e", skip_empty=True, sizing=sizing
+            )
+        key_lines = _encode_scalar_lines(
+            key_type,
+            "k",
+            encode_varint(1 << 3 | _wire_type(key_type)),
+            out="e",
+            skip_empty=True,
+            sizing=sizing,
+        )
+        # Entries with only empty length-delimited keys and values are omitted.
+        write = [
+            "for k, x in v.items():",
+            f"    e = {0 if sizing else 'bytearray()'}",
+            *_indent(key_lines),
+            *_indent(value_lines),
+            "    if e:",
+            *_indent(delimited("e", tag), 2),
+        ]
+    elif field_plan.packed:
+        # Packed lists look like a length-delimited field.
+        if proto_type in FIXED_TYPES:
+            # Fixed-width values are all packed with a single struct call.
+            fmt = _pack_fmt(proto_type)
+            if sizing:
+                write = [f"buf = {struct.calcsize(fmt)} * len(v)"]
+            else:
+                write = [f"buf = _pack(f'<{{len(v)}}{fmt[1:]}', *v)"]
+        else:
+            if proto_type in (TYPE_SINT32, TYPE_SINT64):
+                # Handle zig-zag encoding.
+                write = ["z = [x << 1 if x >= 0 else (x << 1) ^ -1 for x in v]"]
+            else:
+                write = ["z = v"]
+            # Lists of values that each fit in a single byte are encoded at once.
+            write += [
+                "try:",
+                "    buf = bytes(z)",
+                "except (TypeError, ValueError):",
+                "    buf = None",
+                "if buf is None or not buf.isascii():",
+                f"    buf = {0 if sizing else 'bytearray()'}",
+                "    for x in z:",
+                *_indent(
+                    _encode_scalar_lines(
+                        TYPE_UINT64, "x", None, out="buf", sizing=sizing
+                    ),
+                    2,
+                ),
+            ]
+            if sizing:
+                write += ["else:", "    buf = len(buf)"]
+        write += delimited("buf", encode_varint(meta.number << 3 | WIRE_LEN_DELIM))
+    elif is_repeated:
+        if is_plain_message:
+            item_lines = [
+                "if isinstance(x, Message):",
+                "    m = _message_size(x, sizes)",
+                *_indent(_encode_message_lines("x", tag, out=out, sizing=sizing)),
+                "else:",
+                *_indent(preprocessed("x", "", out, False)),
+            ]
+        elif proto_type == TYPE_MESSAGE:
+            item_lines = preprocessed("x", meta.wraps or "", out, False)
+        else:
+            item_lines = _encode_scalar_lines(
+                proto_type, "x", tag, out=out, sizing=sizing
+            )
+        write = ["for x in v:", *_indent(item_lines)]
+    elif is_plain_message:
+        if meta.group or meta.optional:
+            # Selected messages are sent even if they are empty.
+            message_lines = [
+                "m = _message_size(v, sizes)",
+                *_encode_message_lines("v", tag, out=out, sizing=sizing),
+            ]
+        else:
+            # Empty messages are only sent on the wire if they were set (or
+            # received empty). A message equal to the default always has an empty
+            # encoding, so checking the size is enough.
+            message_lines = [
+                "m = _message_size(v, sizes)",
+                "if m or v._serialized_on_wire:",
+                *_indent(_encode_message_lines("v", tag, out=out, sizing=sizing)),
+            ]
+        write = [
+            "if v.__class__ is _LazyMessage:",
+            # Messages that were never parsed are sent as they were received.
+            f"    b = {'len(v.data)' if sizing else 'v.data'}",
+            *_indent(delimited("b", tag)),
+            "elif isinstance(v, Message):",
+            *_indent(message_lines),
+            "else:",
+            f"    {fallback}",
+        ]
+    elif proto_type == TYPE_MESSAGE:
+        # Well-known types mapped to Python builtins and wrapped scalars.
+        write = [fallback]
+    elif meta.group or meta.optional:
+        write = _encode_scalar_lines(proto_type, "v", tag, out=out, sizing=sizing)
+    else:
+        # Default (zero) values are not serialized.
+        return [
+            f"v = {_load_field(proto_meta, field_name)}",
+            "if v and v is not PLACEHOLDER:",
+            *_indent(
+                _encode_scalar_lines(proto_type, "v", tag, out=out, sizing=sizing)
+            ),
+        ]
+
+    if meta.group:
+        # Only the selected field of a `oneof` group is serialized, and it is sent
+        # even if it has the default (zero) value.
+        return [
+            f"if gc.get({meta.group!r}) == {field_name!r}:",
+            f"    v = {_load_field(proto_meta, field_name)}",
+            "    if v is PLACEHOLDER:",
+            f"        v = self._get_field_default({field_name!r})",
+            "    if v is not None:",
+            *_indent(write, 2),
+        ]
+    if is_repeated or proto_type == TYPE_MAP:
+        return [
+            f"v = {_load_field(proto_meta, field_name)}",
+            "if v and v is not PLACEHOLDER:",
+            *_indent(write),
+        ]
+    return [
+        f"v = {_load_field(proto_meta, field_name)}",
+        "if v is not None and v is not PLACEHOLDER:",
+        *_indent(write),
+    ]
+
+
+def _field_storage_lines(
+    proto_meta: ProtoClassMetadata, namespace: Dict[str, Any]
+) -> List[str]:
+    """
+    Source lines preparing the access to the fields of ``self`` in a compiled
+    function, see :func:`_load_field` and :func:`_store_field`. The accessors of
+    the slots of a class with ``__slots__`` are added to ``namespace``.
+    """
+    if proto_meta.slots is None:
+        return ["d = self.__dict__"]
+    for field_name, slot in proto_meta.slots.items():
+        namespace[f"_get_{field_name}"] = slot.__get__
+        namespace[f"_set_{field_name}"] = slot.__set__
+    return []
+
+
+def _load_field(proto_meta: ProtoClassMetadata, field_name: str) -> str:
+    """The expression of the stored value of a field of ``self``."""
+    if proto_meta.slots is None:
+        return f"d[{field_name!r}]"
+    return f"_get_{field_name}(self)"
+
+
+def _store_field(proto_meta: ProtoClassMetadata, field_name: str, value: str) -> str:
+    """The statement storing ``value`` as the value of a field of ``self``."""
+    if proto_meta.slots is None:
+        return f"d[{field_name!r}] = {value}"
+    return f"_set_{field_name}(self, {value})"
+
+
+def _compile_serializer(proto_meta: ProtoClassMetadata, sizing: bool) -> Callable:
+    namespace: Dict[str, Any] = {
+        "PLACEHOLDER": PLACEHOLDER,
+        "Message": Message,
+        "_encode_varint": encode_varint,
+        "_size_varint": size_varint,
+        "_message_size": _message_size,
+        "_preprocess_single": _preprocess_single,
+        "_serialize_field": _serialize_field,
+        "_pack": struct.pack,
+        "_LazyMessage": _LazyMessage,
+    }
+    for proto_type in FIXED_TYPES:
+        namespace[f"_pack_{proto_type}"] = struct.Struct(_pack_fmt(proto_type)).pack
+
+    if sizing:
+        name = "size"
+        lines = ["def size(self, sizes):", "    n = 0"]
+    else:
+        name = "encode"
+        lines = ["def encode(self, out, sizes):"]
+    lines += _indent(_field_storage_lines(proto_meta, namespace))
+    if proto_meta.oneof_field_by_group:
+        lines.append("    gc = self._group_current")
+    for field_name, meta in proto_meta.meta_by_field_name.items():
+        lines += _indent(
+            _encode_field_lines(proto_meta, field_name, meta, namespace, sizing)
+        )
+    if sizing:
+        lines += ["    n += len(self._unknown_fields)", "    return n"]
+    else:
+        lines += [
+            "    if self._unknown_fields:",
+            "        out += bytes(self._unknown_fields)",
+        ]
+
+    exec("\n".join(lines), namespace)
+    function = namespace[name]
+    function.__qualname__ = f"{proto_meta.cls.__qualname__}.{name}"
+    return function
+
+
+def _compile_encoder(
+    proto_meta: ProtoClassMetadata,
+) -> Callable[["Message", bytearray, Dict[int, int]], None]:
+    """
+    Generates and compiles a serializer specialized for a message class. The
+    generated function appends the binary encoding of a message to a
+    :class:`bytearray`, reading the field values straight from the instance
+    ``__dict__`` (or slots) and with the tags inlined as constants.
+
+    Nested messages are encoded in place after their length prefix. Their sizes
+    are computed by the compiled sizers and cached by ``id`` in the given dict, so
+    that each message in the tree is only measured once per serialization.
+    """
+    return _compile_serializer(proto_meta, sizing=False)
+
+
+def _compile_sizer(
+    proto_meta: ProtoClassMetadata,
+) -> Callable[["Message", Dict[int, int]], int]:
+    """
+    Generates and compiles a function computing the size of the binary encoding of
+    a message without serializing it. The sizes of nested messages are cached by
+    ``id`` in the given dict for the serializer to write their length prefixes.
+    """
+    return _compile_serializer(proto_meta, sizing=True)
+
+
+def _compile_plan(proto_meta: ProtoClassMetadata) -> MessagePlan:
+    """
+    Computes the plan of a message class, generating and compiling the encoder and
+    decoder of each of its fields.
+    """
+    namespace: Dict[str, Any] = {
+        "Message": Message,
+        "_encode_varint": encode_varint,
+        "_decode_varint": decode_varint,
+        "_message_size": _message_size,
+        "_serialize_single": _serialize_single,
+        "_truncated": _truncated,
+        "_message_cls": proto_meta.cls,
+        "_Timestamp": _Timestamp,
+        "_Duration": _Duration,
+    }
+    for proto_type in FIXED_TYPES:
+        fmt = struct.Struct(_pack_fmt(proto_type))
+        namespace[f"_pack_{proto_type}"] = fmt.pack
+        namespace[f"_unpack_{proto_type}"] = fmt.unpack_from
+
+    fields = []
+    lines = []
+    for index, field_name in enumerate(proto_meta.sorted_field_names):
+        meta = proto_meta.meta_by_field_name[field_name]
+        proto_type = meta.proto_type
+        field_cls = proto_meta.cls_by_field[field_name]
+        wire_type = _wire_type(proto_type)
+        tag = encode_varint(meta.number << 3 | wire_type)
+        repeated = proto_meta.default_gen[field_name] is list
+        fields.append(
+            (
+                field_name,
+                meta.number,
+                proto_type,
+                wire_type,
+                tag,
+                repeated,
+                repeated and proto_type in PACKED_TYPES,
+            )
+        )
+
+        if proto_type == TYPE_MAP:
+            # Map entries are encoded as messages.
+            namespace[f"_entry_{field_name}"] = field_cls
+            encode = [
+                f"v = _entry_{field_name}(*v)",
+                "sizes = {}",
+                "m = _message_size(v, sizes)",
+                *_encode_message_lines("v", tag),
+            ]
+        elif proto_type != TYPE_MESSAGE:
+            encode = _encode_scalar_lines(proto_type, "v", tag)
+        elif (
+            not meta.wraps
+            and isinstance(field_cls, type)
+            and issubclass(field_cls, Message)
+        ):
+            encode = [
+                "sizes = {}",
+                "m = _message_size(v, sizes)",
+                *_encode_message_lines("v", tag),
+            ]
+        else:
+            encode = [
+                f"out += _serialize_single({meta.number}, {proto_type!r}, v, "
+                f"serialize_empty=True, wraps={meta.wraps or ''!r})"
+            ]
+        encode = [
+            # The functions are named by index, as field names could collide
+            # with the names of the helpers.
+            f"def _f{index}_encode(v):",
+            "    out = bytearray()",
+            *_indent(encode),
+            "    return bytes(out)",
+        ]
+
+        decode = _decode_value_lines(
+            proto_meta,
+            field_name,
+            TYPE_MESSAGE if proto_type == TYPE_MAP else proto_type,
+            meta.wraps,
+            namespace,
+        )
+        if proto_type == TYPE_MAP:
+            decode.append("v = (v.key, v.value)")
+        decode = [
+            f"def _f{index}_decode(data, pos):",
+            "    end = len(data)",
+            *_indent(
+                [
+                    line.replace("_truncated(self)", "_truncated(_message_cls)")
+                    for line in decode
+                ]
+            ),
+            "    return v, pos",
+        ]
+        lines += encode + decode
+
+    exec("\n".join(lines), namespace)
+    plans = []
+    for index, field in enumerate(fields):
+        field_name = field[0]
+        encode = namespace[f"_f{index}_encode"]
+        decode = namespace[f"_f{index}_decode"]
+        for kind, function in (("encode", encode), ("decode", decode)):
+            function.__qualname__ = (
+                f"{proto_meta.cls.__qualname__}._{kind}_{field_name}"
+            )
+        plans.append(FieldPlan(*field, encode=encode, decode=decode))
+
+    return MessagePlan(
+        cls=proto_meta.cls,
+        fields=tuple(plans),
+        by_name=MappingProxyType({plan.name: plan for plan in plans}),
+        by_number=MappingProxyType({plan.number: plan for plan in plans}),
+    )
+
+
+class _LazyMessage:
+    """
+    A message field value kept in its encoded form by a lazy parse. It is parsed
+    into a message of ``cls`` when the field is first accessed, and is otherwise
+    serialized again as is.
+    """
+
+    __slots__ = ("cls", "data", "lazy", "zero_copy")
+
+    def __init__(self, cls: Type["Message"], data: bytes, lazy: bool, zero_copy: bool):
+        self.cls = cls
+        self.data = data
+        # The options of the parse, which also apply to the nested message
+        self.lazy = lazy
+        self.zero_copy = zero_copy
+
+    def parse(self) -> "Message":
+        message = self.cls()
+        decoder = self.cls._betterproto.decoder_for(self.lazy, self.zero_copy)
+        try:
+            decoder(message, self.data, 0, len(self.data))
+        except (EOFError, IndexError):
+            raise _truncated(message) from None
+        return message
+
+
+class _FieldDescriptor:
+    """
+    The descriptor of a field of a message class, which replaces the placeholder
+    default value left on the class by :func:`dataclasses.dataclass`. The value of
+    the field is stored in the ``__dict__`` of the message. It initializes the
+    default value of the field when it is first accessed, and parses a lazily
+    parsed message field on first access.
+
+    Setting the field stores the value and marks the message as serialized on the
+    wire.
+    """
+
+    __slots__ = ("name", "message")
+
+    def __init__(self, name: str, message: bool):
+        self.name = name
+        self.message = message
+
+    def __get__(self, instance: Optional["Message"], owner: Any = None) -> Any:
+        if instance is None:
+            return PLACEHOLDER
+        d = instance.__dict__
+        value = d.get(self.name, PLACEHOLDER)
+        if value is PLACEHOLDER:
+            # Lazily initialize default values to avoid infinite recursion for
+            # recursive message types.
+            value = d[self.name] = instance._get_field_default(self.name)
+        elif value.__class__ is _LazyMessage:
+            value = d[self.name] = value.parse()
+        return value
+
+    def __set__(self, instance: "Message", value: Any) -> None:
+        if self.message:
+            _mark_empty_message(value)
+        instance.__dict__[self.name] = value
+        instance._serialized_on_wire = True
+
+    def __delete__(self, instance: "Message") -> None:
+        try:
+            del instance.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name) from None
+
+
+class _OneofFieldDescriptor(_FieldDescriptor):
+    """
+    The descriptor of a field of a ``oneof`` group, raising
+    :class:`AttributeError` on attempts to access it while another field of the
+    group is set. Setting the field unsets the other fields of the group.
+    """
+
+    __slots__ = ("group", "siblings")
+
+    def __init__(self, name: str, message: bool, group: str, siblings: Tuple[str, ...]):
+        super().__init__(name, message)
+        self.group = group
+        self.siblings = siblings
+
+    def __get__(self, instance: Optional["Message"], owner: Any = None) -> Any:
+        if instance is not None:
+            _check_oneof_selected(instance, self.name, self.group)
+        return _FieldDescriptor.__get__(self, instance, owner)
+
+    def __set__(self, instance: "Message", value: Any) -> None:
+        group_current = getattr(instance, "_group_current", None)
+        if group_current is not None:  # __post_init__ had already run
+            group_current[self.group] = self.name
+            d = instance.__dict__
+            for sibling in self.siblings:
+                d[sibling] = PLACEHOLDER
+        _FieldDescriptor.__set__(self, instance, value)
+
+
+class _SlotFieldDescriptor(_FieldDescriptor):
+    """
+    The descriptor of a field of a message class with ``__slots__``, which
+    replaces the descriptor of the slot of the field and stores the value of the
+    field in it instead of the ``__dict__`` of the message.
+    """
+
+    __slots__ = ("slot",)
+
+    def __init__(self, name: str, message: bool, slot: MemberDescriptorType):
+        super().__init__(name, message)
+        self.slot = slot
+
+    def __get__(self, instance: Optional["Message"], owner: Any = None) -> Any:
+        if instance is None:
+            return PLACEHOLDER
+        value = self.slot.__get__(instance)
+        if value is PLACEHOLDER:
+            value = instance._get_field_default(self.name)
+            self.slot.__set__(instance, value)
+        elif value.__class__ is _LazyMessage:
+            value = value.parse()
+            self.slot.__set__(instance, value)
+        return value
+
+    def __set__(self, instance: "Message", value: Any) -> None:
+        if self.message:
+            _mark_empty_message(value)
+        self.slot.__set__(instance, value)
+        instance._serialized_on_wire = True
+
+    def __delete__(self, instance: "Message") -> None:
+        self.slot.__delete__(instance)
+
+
+class _SlotOneofFieldDescriptor(_SlotFieldDescriptor):
+    """The descriptor of a field of a ``oneof`` group stored in a slot."""
+
+    __slots__ = ("group", "siblings")
+
+    def __init__(
+        self,
+        name: str,
+        message: bool,
+        slot: MemberDescriptorType,
+        group: str,
+        siblings: Tuple[MemberDescriptorType, ...],
+    ):
+        super().__init__(name, message, slot)
+        self.group = group
+        self.siblings = siblings
+
+    def __get__(self, instance: Optional["Message"], owner: Any = None) -> Any:
+        if instance is not None:
+            _check_oneof_selected(instance, self.name, self.group)
+        return _SlotFieldDescriptor.__get__(self, instance, owner)
+
+    def __set__(self, instance: "Message", value: Any) -> None:
+        group_current = getattr(instance, "_group_current", None)
+        if group_current is not None:  # __post_init__ had already run
+            group_current[self.group] = self.name
+            for sibling in self.siblings:
+                sibling.__set__(instance, PLACEHOLDER)
+        _SlotFieldDescriptor.__set__(self, instance, value)
+
+
+def _mark_empty_message(value: Any) -> None:
+    """Empty messages are only serialized if they are explicitly set."""
+    if isinstance(value, Message) and not type(value)._betterproto.meta_by_field_name:
+        value._serialized_on_wire = True
+
+
+def _check_oneof_selected(instance: "Message", name: str, group: str) -> None:
+    """
+    Raises :class:`AttributeError` if another field of the ``oneof`` group of the
+    field is set.
+    """
+    group_current = getattr(instance, "_group_current", None)
+    if group_current is not None and group_current[group] != name:
+        message = f"{group!r} is set to {group_current[group]!r}, not {name!r}"
+        if sys.version_info < (3, 10):
+            raise AttributeError(message)
+        raise AttributeError(message, name=name, obj=instance)
+
+
+def _install_field_descriptors(cls: Type["Message"], meta: ProtoClassMetadata) -> None:
+    """
+    Replaces the default values left on the dataclass ``cls``, or the descriptors
+    of its slots, by the descriptors of its fields, which then also replace
+    :meth:`Message.__setattr__`.
+    """
+    slots = meta.slots
+    for name, field_meta in meta.meta_by_field_name.items():
+        message = field_meta.proto_type == TYPE_MESSAGE
+        descriptor: _FieldDescriptor
+        if field_meta.group:
+            siblings = tuple(
+                other
+                for other, other_meta in meta.meta_by_field_name.items()
+                if other_meta.group == field_meta.group and other != name
+            )
+            if slots is None:
+                descriptor = _OneofFieldDescriptor(
+                    name, message, field_meta.group, siblings
+                )
+            else:
+                descriptor = _SlotOneofFieldDescriptor(
+                    name,
+                    message,
+                    slots[name],
+                    field_meta.group,
+                    tuple(slots[sibling] for sibling in siblings),
+                )
+        elif slots is None:
+            descriptor = _FieldDescriptor(name, message)
+        else:
+            descriptor = _SlotFieldDescriptor(name, message, slots[name])
+        setattr(cls, name, descriptor)
+    if cls.__setattr__ is Message.__setattr__:
+        cls.__setattr__ = object.__setattr__  # type: ignore
+
+
+def _parse_loaded(message: T, data: bytes, size: Optional[int]) -> T:
+    """Parses ``data`` read from a stream by :meth:`Message.load`."""
+    try:
+        return message.parse(data)
+    except ValueError as e:
+        if size is None:
+            raise
+        raise ValueError(
+            f"Expected message of size {size}, but the data read from the stream "
+            "is not a complete message - the expected size may have been "
+            "incorrect."
+        ) from e
+
+
+def _iter_repeated(
+    cls: Type["Message"],
+    field: FieldPlan,
+    data: Union["ReadableBuffer", "SupportsRead[bytes]"],
+    rest: Optional["Message"],
+) -> Iterator[Any]:
+    """The generator of :meth:`Message.iter_repeated`."""
+    # The other fields, parsed into `rest` at the end
+    other = bytearray()
+    try:
+        if hasattr(data, "read"):
+            for parsed in load_fields(data):  # type: ignore
+                raw = parsed.raw
+                if parsed.number != field.number:
+                    if rest is not None:
+                        other += raw
+                elif parsed.wire_type == field.wire_type:
+                    yield field.decode(raw, decode_varint(raw, 0)[1])[0]
+                elif field.packed and parsed.wire_type == WIRE_LEN_DELIM:
+                    value, pos = parsed.value, 0
+                    while pos < len(value):
+                        element, pos = field.decode(value, pos)
+                        yield element
+        else:
+            if data.__class__ is not bytes:
+                data = memoryview(data).cast("B")  # type: ignore
+            end = len(data)  # type: ignore
+            field_start = 0
+            for tag, value_pos, start, pos in _field_offsets(data, 0, end):
+                if pos > end:
+                    raise _truncated(cls)
+                wire_type = tag & 0x7
+                if tag >> 3 != field.number:
+                    if rest is not None:
+                        other += data[field_start:pos]  # type: ignore
+                elif wire_type == field.wire_type:
+                    yield field.decode(data, value_pos)[0]
+                elif field.packed and wire_type == WIRE_LEN_DELIM:
+                    while start < pos:
+                        element, start = field.decode(data, start)
+                        yield element
+                field_start = pos
+    except (EOFError, IndexError):
+        raise _truncated(cls) from None
+
+    if rest is not None:
+        rest.parse(other)
+
+
+def _truncated(message: Union["Message", Type["Message"]]) -> ValueError:
+    cls = message if isinstance(message, type) else message.__class__
+    return ValueError(f"Unexpected end of data while parsing {cls.__name__}")
+
+
+def _skip_field(data: bytes, pos: int, wire_type: int) -> int:
+    """
+    Skips over the value of a field of the given wire type in a byte buffer.
+    Returns the position in the buffer after the value.
+    """
+    if wire_type == WIRE_VARINT:
+        return decode_varint(data, pos)[1]
+    elif wire_type == WIRE_FIXED_64:
+        return pos + 8
+    elif wire_type == WIRE_LEN_DELIM:
+        length, pos = decode_varint(data, pos)
+        return pos + length
+    elif wire_type == WIRE_FIXED_32:
+        return pos + 4
+    raise ValueError(f"Unsupported wire type {wire_type}")
+
+
+def _decode_value_lines(
+    proto_meta: ProtoClassMetadata,
+    field_name: str,
+    proto_type: str,
+    wraps: Optional[str],
+    namespace: Dict[str, Any],
+    decoder: Optional[str] = None,
+    zero_copy: bool = False,
+) -> List[str]:
+    """
+    Source lines reading a single value of ``proto_type`` from ``data`` at ``pos``
+    into ``v``, advancing ``pos`` past it. Nested messages are parsed with the
+    ``decoder`` expression if given, and with the decoder of their class otherwise.
+    ``bytes`` values are slices of ``data`` if ``zero_copy`` is set.
+    """
+    if proto_type in WIRE_VARINT_TYPES:
+        lines = [
+            "v = data[pos]",
+            "if v < 0x80:",
+            "    pos += 1",
+            "else:",
+            "    v, pos = _decode_varint(data, pos)",
+        ]
+        if proto_type in (TYPE_INT32, TYPE_INT64):
+            bits = 32 if proto_type == TYPE_INT32 else 64
+            signbit = 1 << (bits - 1)
+            lines += [
+                f"if v >= {signbit:#x}:",
+                f"    v = ((v & {(1 << bits) - 1:#x}) ^ {signbit:#x}) - {signbit:#x}",
+            ]
+        elif proto_type in (TYPE_SINT32, TYPE_SINT64):
+            # Undo zig-zag encoding
+            lines.append("v = (v >> 1) ^ -(v & 1)")
+        elif proto_type == TYPE_BOOL:
+            lines.append("v = v > 0")
+        elif proto_type == TYPE_ENUM:
+            namespace[f"_cls_{field_name}"] = proto_meta.cls_by_field[field_name]
+            lines.append(f"v = _cls_{field_name}.try_value(v)")
+        return lines
+
+    if proto_type in FIXED_TYPES:
+        size = struct.calcsize(_pack_fmt(proto_type))
+        return [
+            f"e = pos + {size}",
+            "if e > end:",
+            "    raise _truncated(self)",
+            f"v = _unpack_{proto_type}(data, pos)[0]",
+            "pos = e",
+        ]
+
+    lines = [
+        "n, pos = _decode_varint(data, pos)",
+        "e = pos + n",
+        "if e > end:",
+        "    raise _truncated(self)",
+    ]
+    if proto_type == TYPE_STRING:
+        lines.append("v = str(data[pos:e], 'utf-8')")
+    elif proto_type == TYPE_BYTES:
+        lines.append("v = data[pos:e]" if zero_copy else "v = bytes(data[pos:e])")
+    else:
+        cls = proto_meta.cls_by_field[field_name]
+        namespace[f"_cls_{field_name}"] = cls
+        if cls is datetime:
+            lines.append("v = _Timestamp().parse(data[pos:e]).to_datetime()")
+        elif cls is timedelta:
+            lines.append("v = _Duration().parse(data[pos:e]).to_timedelta()")
+        elif wraps:
+            # This is a Google wrapper value message around a single scalar type.
+            namespace[f"_wrapper_{field_name}"] = _get_wrapper(wraps)
+            lines.append(f"v = _wrapper_{field_name}().parse(data[pos:e]).value")
+        else:
+            decoder = decoder or f"_cls_{field_name}._betterproto.decoder"
+            lines += [f"v = _cls_{field_name}()", f"{decoder}(v, data, pos, e)"]
+    lines.append("pos = e")
+    return lines
+
+
+def _decode_packed_lines(
+    proto_meta: ProtoClassMetadata,
+    field_name: str,
+    proto_type: str,
+    value_lines: List[str],
+) -> List[str]:
+    """
+    Source lines extending the list ``cur`` with the packed values of
+    ``proto_type`` in ``data[pos:packed_end]``, where ``value_lines`` decode a
+    single value.
+    """
+    if proto_type in FIXED_TYPES:
+        # Fixed-width values are all unpacked with a single struct call.
+        fmt = _pack_fmt(proto_type)
+        size = struct.calcsize(fmt)
+        return [
+            f"if n % {size}:",
+            "    raise _truncated(self)",
+            f"cur.extend(_unpack_from(f'<{{n // {size}}}{fmt[1:]}', data, pos))",
+            "pos = packed_end",
+        ]
+
+    # A chunk without continuation bits only holds single-byte varints, which are
+    # decoded at once.
+    if proto_type in (TYPE_SINT32, TYPE_SINT64):
+        values = "[(x >> 1) ^ -(x & 1) for x in chunk]"
+    elif proto_type == TYPE_BOOL:
+        values = "[x > 0 for x in chunk]"
+    elif proto_type == TYPE_ENUM:
+        values = f"map(_cls_{field_name}.try_value, chunk)"
+    else:
+        values = "chunk"
+    return [
+        "chunk = bytes(data[pos:packed_end])",
+        "if chunk.isascii():",
+        f"    cur.extend({values})",
+        "    pos = packed_end",
+        "while pos < packed_end:",
+        *_indent(value_lines),
+        "    cur.append(v)",
+        "if pos != packed_end:",
+        "    raise _truncated(self)",
+    ]
+
+
+def _decode_field_branches(
+    proto_meta: ProtoClassMetadata,
+    field_name: str,
+    meta: FieldMetadata,
+    namespace: Dict[str, Any],
+    lazy: bool = False,
+    decoder: Optional[str] = None,
+    zero_copy: bool = False,
+) -> List[Tuple[int, List[str]]]:
+    """
+    The tags a field is accepted with, each with the source lines that decode the
+    field from ``data`` at ``pos`` and assign it to the message. Nested messages are
+    parsed with the ``decoder`` expression if given.
+    """
+    proto_type = meta.proto_type
+    field_plan = proto_meta.plan.by_name[field_name]
+    tag = meta.number << 3 | field_plan.wire_type
+    field_cls = proto_meta.cls_by_field[field_name]
+    nested_decoder = decoder
+    if (lazy or zero_copy) and decoder is None:
+        nested_decoder = (
+            f"_cls_{field_name}._betterproto.decoder_for({lazy}, {zero_copy})"
+        )
+
+    if proto_type == TYPE_MAP:
+        return [
+            (
+                tag,
+                [
+                    *_decode_value_lines(
+                        proto_meta,
+                        field_name,
+                        TYPE_MESSAGE,
+                        None,
+                        namespace,
+                        nested_decoder,
+                        zero_copy,
+                    ),
+                    f"cur = {_load_field(proto_meta, field_name)}",
+                    "if cur is PLACEHOLDER:",
+                    "    cur = {}",
+                    f"    {_store_field(proto_meta, field_name, 'cur')}",
+                    # Value represents a single key/value pair entry in the map.
+                    "cur[v.key] = v.value",
+                ],
+            )
+        ]
+
+    if (
+        proto_type == TYPE_MESSAGE
+        and not field_plan.repeated
+        and not meta.wraps
+        and isinstance(field_cls, type)
+        and issubclass(field_cls, Message)
+        and (lazy or field_cls._betterproto_lazy)
+        and decoder is None
+    ):
+        # Keep the encoded message to parse it when the field is first accessed.
+        namespace[f"_cls_{field_name}"] = field_cls
+        value_lines = [
+            "n, pos = _decode_varint(data, pos)",
+            "e = pos + n",
+            "if e > end:",
+            "    raise _truncated(self)",
+            f"v = _LazyMessage(_cls_{field_name}, "
+            f"{'data[pos:e]' if zero_copy else 'bytes(data[pos:e])'}, "
+            f"{lazy}, {zero_copy})",
+            "pos = e",
+        ]
+    else:
+        value_lines = _decode_value_lines(
+            proto_meta,
+            field_name,
+            proto_type,
+            meta.wraps,
+            namespace,
+            nested_decoder,
+            zero_copy,
+        )
+    if field_plan.repeated:
+        current = [
+            f"cur = {_load_field(proto_meta, field_name)}",
+            "if cur is PLACEHOLDER:",
+            "    cur = []",
+            f"    {_store_field(proto_meta, field_name, 'cur')}",
+        ]
+        branches = [(tag, [*value_lines, *current, "cur.append(v)"])]
+        if field_plan.packed:
+            # This is a packed repeated field.
+            branches.append(
+                (
+                    meta.number << 3 | WIRE_LEN_DELIM,
+                    [
+                        "n, pos = _decode_varint(data, pos)",
+                        "packed_end = pos + n",
+                        "if packed_end > end:",
+                        "    raise _truncated(self)",
+                        *current,
+                        *_decode_packed_lines(
+                            proto_meta, field_name, proto_type, value_lines
+                        ),
+                    ],
+                )
+            )
+        return branches
+
+    if meta.group:
+        siblings = [
+            field.name
+            for field in proto_meta.oneof_field_by_group[meta.group]
+            if field.name != field_name
+        ]
+        assign = [
+            *[
+                _store_field(proto_meta, sibling, "PLACEHOLDER")
+                for sibling in sorted(siblings)
+            ],
+            f"gc[{meta.group!r}] = {field_name!r}",
+            _store_field(proto_meta, field_name, "v"),
+        ]
+    else:
+        assign = [_store_field(proto_meta, field_name, "v")]
+    return [(tag, value_lines + assign)]
+
 
-            if meta.group:
-                # This is part of a one-of group.
-                by_field[field.name] = meta.group
+def _compile_decoder(
+    proto_meta: ProtoClassMetadata,
+    lazy: bool = False,
+    zero_copy: bool = False,
+    only: Optional[AbstractSet[str]] = None,
+    keep_skipped: bool = True,
+) -> Callable[["Message", bytes, int, int], None]:
+    """
+    Generates and compiles a parser specialized for a message class. The generated
+    function parses the fields encoded in ``data[pos:end]`` into a message, where
+    ``data`` is a :class:`bytes` object or a byte :class:`memoryview`,
+    dispatching on the tag of each field straight to the code that decodes and
+    assigns it. Fields with unknown numbers or unexpected wire types are kept as
+    unknown fields.
+
+    If ``lazy`` is set, singular message fields are kept encoded and only parsed
+    when they are first accessed, see :class:`_LazyMessage`.
+
+    If ``zero_copy`` is set, ``bytes`` fields are slices of ``data``, which must
+    be a :class:`memoryview`.
+
+    If ``only`` is given, only the fields on these (dotted) paths are parsed, and
+    the other fields are skipped over. The skipped fields are kept as unknown
+    fields if ``keep_skipped`` is set.
+    """
+    fields: Dict[str, Optional[Set[str]]] = {}
+    if only is None:
+        fields = dict.fromkeys(proto_meta.meta_by_field_name)
+    else:
+        for path in only:
+            field_name, _, rest = path.partition(".")
+            if field_name not in proto_meta.meta_by_field_name:
+                raise ValueError(
+                    f"{proto_meta.cls.__name__} has no field {field_name!r}"
+                )
+            if not rest:
+                fields[field_name] = None
+            elif fields.setdefault(field_name, set()) is not None:
+                fields[field_name].add(rest)
+
+    namespace: Dict[str, Any] = {
+        "PLACEHOLDER": PLACEHOLDER,
+        "_LazyMessage": _LazyMessage,
+        "_decode_varint": decode_varint,
+        "_skip_field": _skip_field,
+        "_truncated": _truncated,
+        "_UnknownFields": UnknownFields,
+        "_Timestamp": _Timestamp,
+        "_Duration": _Duration,
+        "_unpack_from": struct.unpack_from,
+    }
+    for proto_type in FIXED_TYPES:
+        namespace[f"_unpack_{proto_type}"] = struct.Struct(
+            _pack_fmt(proto_type)
+        ).unpack_from
+
+    branches: List[Tuple[int, List[str]]] = []
+    for number in sorted(proto_meta.field_name_by_number):
+        field_name = proto_meta.field_name_by_number[number]
+        if field_name not in fields:
+            continue
+        meta = proto_meta.meta_by_field_name[field_name]
+        decoder = None
+        paths = fields[field_name]
+        if paths is not None:
+            # Only parse some of the fields of the nested messages.
+            field_cls = proto_meta.cls_by_field[field_name]
+            if not (
+                meta.proto_type == TYPE_MESSAGE
+                and not meta.wraps
+                and isinstance(field_cls, type)
+                and issubclass(field_cls, Message)
+            ):
+                raise ValueError(
+                    f"Field {field_name!r} of {proto_meta.cls.__name__} is not a "
+                    "message field"
+                )
+            decoder = f"_decoder_{field_name}"
+            namespace[decoder] = field_cls._betterproto.decoder_for(
+                lazy, zero_copy, paths, keep_skipped
+            )
+        branches += _decode_field_branches(
+            proto_meta, field_name, meta, namespace, lazy, decoder, zero_copy
+        )
 
-                by_group.setdefault(meta.group, set()).add(field)
+    lines = [
+        "def decode(self, data, pos, end):",
+        *_indent(_field_storage_lines(proto_meta, namespace)),
+        "    self._serialized_on_wire = True",
+    ]
+    if proto_meta.oneof_field_by_group:
+        lines.append("    gc = self._group_current")
+    lines += [
+        "    while pos < end:",
+        "        start = pos",
+        "        tag = data[pos]",
+        "        if tag < 0x80:",
+        "            pos += 1",
+        "        else:",
+        "            tag, pos = _decode_varint(data, pos)",
+    ]
+    for index, (tag, branch_lines) in enumerate(branches):
+        lines.append(f"        {'if' if index == 0 else 'elif'} tag == {tag}:")
+        lines += _indent(branch_lines, 3)
+    unknown = [
+        "pos = _skip_field(data, pos, tag & 7)",
+        "if pos > end:",
+        "    raise _truncated(self)",
+    ]
+    keep = [
+        "u = self._unknown_fields",
+        # Messages share empty bytes until an unknown field is parsed.
+        "if u.__class__ is not _UnknownFields:",
+        "    u = self._unknown_fields = _UnknownFields(u)",
+        # Unknown fields only reference the parsed data with zero_copy.
+        "u._append(tag >> 3, "
+        f"{'data[start:pos]' if zero_copy else 'bytes(data[start:pos])'})",
+    ]
+    if keep_skipped or len(fields) == len(proto_meta.meta_by_field_name):
+        unknown += keep
+    else:
+        # Fields skipped by the projection are dropped.
+        namespace["_numbers"] = frozenset(proto_meta.field_name_by_number)
+        unknown += ["if tag >> 3 not in _numbers:", *_indent(keep)]
+    if branches:
+        lines += ["        else:", *_indent(unknown, 3)]
+    else:
+        lines += _indent(unknown, 2)
+    lines += ["    if pos != end:", "        raise _truncated(self)"]
 
-            by_field_name[field.name] = meta
-            by_field_number[meta.number] = field.name
+    exec("\n".join(lines), namespace)
+    decode = namespace["decode"]
+    decode.__qualname__ = f"{proto_meta.cls.__qualname__}.decode"
+    return decode
 
-        self.oneof_group_by_field = by_field
-        self.oneof_field_by_group = by_group
-        self.field_name_by_number = by_field_number
-        self.meta_by_field_name = by_field_name
-        self.sorted_field_names = tuple(
-            by_field_number[number] for number in sorted(by_field_number)
-        )
-        self.default_gen = self._get_default_gen(cls, fields)
-        self.cls_by_field = self._get_cls_by_field(cls, fields)
 
-    @staticmethod
-    def _get_default_gen(
-        cls: Type["Message"], fields: Iterable[dataclasses.Field]
-    ) -> Dict[str, Callable[[], Any]]:
-        return {field.name: cls._get_field_default_gen(field) for field in fields}
+def _post_init_lines(
+    proto_meta: ProtoClassMetadata, values: Dict[str, str]
+) -> List[str]:
+    """
+    Source lines initializing the state of ``self`` from the ``values`` of its
+    fields: the message is serialized on the wire if any field is set, and the
+    last set field of each ``oneof`` group is the selected one.
+    """
+    is_set = {}
+    for field_name, meta in proto_meta.meta_by_field_name.items():
+        value = values[field_name]
+        is_set[field_name] = f"{value} is not PLACEHOLDER"
+        if meta.optional:
+            is_set[field_name] += f" and {value} is not None"
+
+    lines = [
+        "self._serialized_on_wire = "
+        + (" or ".join(f"({check})" for check in is_set.values()) or "False"),
+        "self._unknown_fields = b''",
+    ]
+    if not proto_meta.oneof_field_by_group:
+        return [*lines, "self._group_current = {}"]
+
+    lines.append("gc = {}")
+    for group in dict.fromkeys(proto_meta.oneof_group_by_field.values()):
+        lines.append(f"gc[{group!r}] = None")
+    for field_name, group in proto_meta.oneof_group_by_field.items():
+        lines += [f"if {is_set[field_name]}:", f"    gc[{group!r}] = {field_name!r}"]
+    return [*lines, "self._group_current = gc"]
+
+
+def _compile_post_init(proto_meta: ProtoClassMetadata) -> Callable[["Message"], None]:
+    """
+    Generates and compiles the function initializing the state of a message of a
+    class after its fields are set, without iterating over the fields.
+    """
+    namespace: Dict[str, Any] = {"PLACEHOLDER": PLACEHOLDER}
+    lines = [
+        "def post_init(self):",
+        *_indent(_field_storage_lines(proto_meta, namespace)),
+    ]
+    values = {}
+    for index, field_name in enumerate(proto_meta.meta_by_field_name):
+        values[field_name] = value = f"v{index}"
+        if proto_meta.slots is None:
+            load = f"d.get({field_name!r}, PLACEHOLDER)"
+        else:
+            load = _load_field(proto_meta, field_name)
+        lines.append(f"    {value} = {load}")
+    lines += _indent(_post_init_lines(proto_meta, values))
 
-    @staticmethod
-    def _get_cls_by_field(
-        cls: Type["Message"], fields: Iterable[dataclasses.Field]
-    ) -> Dict[str, Type]:
-        field_cls = {}
+    exec("\n".join(lines), namespace)
+    post_init = namespace["post_init"]
+    post_init.__qualname__ = f"{proto_meta.cls.__qualname__}.post_init"
+    return post_init
 
-        for field in fields:
-            meta = FieldMetadata.get(field)
-            if meta.proto_type == TYPE_MAP:
-                assert meta.map_types
-                kt = cls._cls_for(field, index=0)
-                vt = cls._cls_for(field, index=1)
-                field_cls[field.name] = dataclasses.make_dataclass(
-                    "Entry",
-                    [
-                        ("key", kt, dataclass_field(1, meta.map_types[0])),
-                        ("value", vt, dataclass_field(2, meta.map_types[1])),
-                    ],
-                    bases=(Message,),
-                )
-                field_cls[f"{field.name}.value"] = vt
-            else:
-                field_cls[field.name] = cls._cls_for(field)
 
-        return field_cls
+def _compile_init(proto_meta: ProtoClassMetadata) -> Optional[Callable[..., None]]:
+    """
+    Generates and compiles an ``__init__`` for a message class equivalent to the
+    one generated by :func:`dataclasses.dataclass`, which stores the fields
+    directly instead of through their descriptors, and initializes the state of
+    the message inline unless the class overrides :meth:`Message.__post_init__`.
+
+    Returns ``None`` if the ``__init__`` of the class is not a plain dataclass
+    ``__init__`` taking the fields as arguments.
+    """
+    cls = proto_meta.cls
+    init = cls.__dict__.get("__init__")
+    code = getattr(init, "__code__", None)
+    fields = dataclasses.fields(cls)
+    names = tuple(field.name for field in fields)
+    namespace: Dict[str, Any] = {
+        "PLACEHOLDER": PLACEHOLDER,
+        "_mark_empty_message": _mark_empty_message,
+    }
+    storage = _field_storage_lines(proto_meta, namespace)
+    if (
+        code is None
+        or code.co_filename != "<string>"
+        or code.co_varnames[: code.co_argcount] != ("self", *names)
+        or code.co_kwonlyargcount
+        or init.__defaults__ != tuple(field.default for field in fields)  # type: ignore
+        or not {"self", "d", "gc", *namespace}.isdisjoint(names)
+    ):
+        return None
+
+    lines = [f"def __init__(self, {', '.join(names)}):", *_indent(storage)]
+    for field_name, meta in proto_meta.meta_by_field_name.items():
+        lines.append(f"    {_store_field(proto_meta, field_name, field_name)}")
+        if meta.proto_type == TYPE_MESSAGE:
+            lines += [
+                f"    if {field_name} is not PLACEHOLDER:",
+                f"        _mark_empty_message({field_name})",
+            ]
+    if cls.__post_init__ is Message.__post_init__:
+        lines += _indent(_post_init_lines(proto_meta, {name: name for name in names}))
+    else:
+        lines.append("    self.__post_init__()")
+
+    exec("\n".join(lines), namespace)
+    function = namespace["__init__"]
+    function.__defaults__ = init.__defaults__  # type: ignore
+    function.__annotations__ = init.__annotations__  # type: ignore
+    function.__qualname__ = init.__qualname__  # type: ignore
+    function.__module__ = init.__module__  # type: ignore
+    return function
 
 
 class Message(ABC):
@@ -733,37 +2464,49 @@ class Message(ABC):
             Calls :meth:`__bool__`.
     """
 
+    __slots__ = ("_serialized_on_wire", "_unknown_fields", "_group_current")
+
     _serialized_on_wire: bool
-    _unknown_fields: bytes
+    _unknown_fields: Union[bytes, UnknownFields]
     _group_current: Dict[str, str]
     _betterproto_meta: ClassVar[ProtoClassMetadata]
+    _betterproto_lazy: ClassVar[bool] = False
 
-    def __post_init__(self) -> None:
-        # Keep track of whether every field was default
-        all_sentinel = True
-
-        # Set current field of each group after `__init__` has already been run.
-        group_current: Dict[str, Optional[str]] = {}
-        for field_name, meta in self._betterproto.meta_by_field_name.items():
-            if meta.group:
-                group_current.setdefault(meta.group)
-
-            value = self.__raw_get(field_name)
-            if value is not PLACEHOLDER and not (meta.optional and value is None):
-                # Found a non-sentinel value
-                all_sentinel = False
-
-                if meta.group:
-                    # This was set, so make it the selected value of the one-of.
-                    group_current[meta.group] = field_name
+    def __init_subclass__(cls, lazy: Optional[bool] = None, **kwargs: Any) -> None:
+        """
+        Parameters
+        -----------
+        lazy: Optional[:class:`bool`]
+            Whether messages of this class are always parsed lazily when they are
+            the value of a (non-repeated) message field, see :meth:`parse`.
+            Inherited from the parent class by default.
+        """
+        super().__init_subclass__(**kwargs)
+        if lazy is not None:
+            cls._betterproto_lazy = lazy
 
-        # Now that all the defaults are set, reset it!
-        self.__dict__["_serialized_on_wire"] = not all_sentinel
-        self.__dict__["_unknown_fields"] = b""
-        self.__dict__["_group_current"] = group_current
+    def __post_init__(self) -> None:
+        # Set whether the message was serialized on the wire and the current field
+        # of each group after `__init__` has already been run.
+        self._betterproto.post_init(self)
 
     def __raw_get(self, name: str) -> Any:
-        return super().__getattribute__(name)
+        # The callers have already initialized the metadata of the class.
+        slots = type(self)._betterproto_meta.slots
+        if slots is None:
+            value = self.__dict__.get(name, PLACEHOLDER)
+            if value.__class__ is _LazyMessage:
+                value = self.__dict__[name] = value.parse()
+            return value
+        slot = slots[name]
+        try:
+            value = slot.__get__(self)
+        except AttributeError:
+            return PLACEHOLDER
+        if value.__class__ is _LazyMessage:
+            value = value.parse()
+            slot.__set__(self, value)
+        return value
 
     def __eq__(self, other) -> bool:
         if type(self) is not type(other):
@@ -808,63 +2551,11 @@ class Message(ABC):
         for field_name in self._betterproto.sorted_field_names:
             yield field_name, self.__raw_get(field_name), PLACEHOLDER
 
-    if not TYPE_CHECKING:
-
-        def __getattribute__(self, name: str) -> Any:
-            """
-            Lazily initialize default values to avoid infinite recursion for recursive
-            message types.
-            Raise :class:`AttributeError` on attempts to access unset ``oneof`` fields.
-            """
-            try:
-                group_current = super().__getattribute__("_group_current")
-            except AttributeError:
-                pass
-            else:
-                if name not in {"__class__", "_betterproto"}:
-                    group = self._betterproto.oneof_group_by_field.get(name)
-                    if group is not None and group_current[group] != name:
-                        if sys.version_info < (3, 10):
-                            raise AttributeError(
-                                f"{group!r} is set to {group_current[group]!r}, not {name!r}"
-                            )
-                        else:
-                            raise AttributeError(
-                                f"{group!r} is set to {group_current[group]!r}, not {name!r}",
-                                name=name,
-                                obj=self,
-                            )
-
-            value = super().__getattribute__(name)
-            if value is not PLACEHOLDER:
-                return value
-
-            value = self._get_field_default(name)
-            super().__setattr__(name, value)
-            return value
-
     def __setattr__(self, attr: str, value: Any) -> None:
-        if (
-            isinstance(value, Message)
-            and hasattr(value, "_betterproto")
-            and not value._betterproto.meta_by_field_name
-        ):
-            value._serialized_on_wire = True
-
-        if attr != "_serialized_on_wire":
-            # Track when a field has been set.
-            self.__dict__["_serialized_on_wire"] = True
-
-        if hasattr(self, "_group_current"):  # __post_init__ had already run
-            if attr in self._betterproto.oneof_group_by_field:
-                group = self._betterproto.oneof_group_by_field[attr]
-                for field in self._betterproto.oneof_field_by_group[group]:
-                    if field.name == attr:
-                        self._group_current[group] = field.name
-                    else:
-                        super().__setattr__(field.name, PLACEHOLDER)
-
-        super().__setattr__(attr, value)
+        # Only reached until the metadata of the class is initialized, which
+        # installs the descriptors of its fields and the default __setattr__.
+        type(self)._betterproto
+        object.__setattr__(self, attr, value)
 
     def __bool__(self) -> bool:
         """True if the Message has any fields with non-default values."""
@@ -901,6 +2592,12 @@ class Message(ABC):
             return cls._betterproto_meta
         except AttributeError:
             cls._betterproto_meta = meta = ProtoClassMetadata(cls)
+            # Now that the class is a dataclass, install the descriptors of its
+            # fields and the specialized __init__.
+            _install_field_descriptors(cls, meta)
+            init = _compile_init(meta)
+            if init is not None:
+                cls.__init__ = init  # type: ignore
             return meta
 
     def dump(self, stream: "SupportsWrite[bytes]", delimit: bool = False) -> None:
@@ -914,204 +2611,143 @@ class Message(ABC):
         delimit:
             Whether to prefix the message with a varint declaring its size.
         """
+        output = bytearray()
+        self._betterproto.encoder(self, output, {})
         if delimit == SIZE_DELIMITED:
-            dump_varint(len(self), stream)
+            # Prefix the size to write the message in a single call.
+            output[:0] = encode_varint(len(output))
+        stream.write(output)
 
-        for field_name, meta in self._betterproto.meta_by_field_name.items():
-            try:
-                value = getattr(self, field_name)
-            except AttributeError:
-                continue
+    async def dump_async(
+        self, writer: "asyncio.StreamWriter", delimit: bool = False
+    ) -> None:
+        """
+        Dumps the binary encoded Protobuf message to an asyncio stream, and waits
+        until it can be written to again.
 
-            if value is None:
-                # Optional items should be skipped. This is used for the Google
-                # wrapper types and proto3 field presence/optional fields.
-                continue
+        Parameters
+        -----------
+        writer: :class:`asyncio.StreamWriter`
+            The stream to dump the message to.
+        delimit:
+            Whether to prefix the message with a varint declaring its size.
+        """
+        self.dump(writer, delimit)
+        await writer.drain()
 
-            # Being selected in a a group means this field is the one that is
-            # currently set in a `oneof` group, so it must be serialized even
-            # if the value is the default zero value.
-            #
-            # Note that proto3 field presence/optional fields are put in a
-            # synthetic single-item oneof by protoc, which helps us ensure we
-            # send the value even if the value is the default zero value.
-            selected_in_group = bool(meta.group) or meta.optional
-
-            # Empty messages can still be sent on the wire if they were
-            # set (or received empty).
-            serialize_empty = isinstance(value, Message) and value._serialized_on_wire
-
-            include_default_value_for_oneof = self._include_default_value_for_oneof(
-                field_name=field_name, meta=meta
-            )
+    @classmethod
+    def stream_writer(
+        cls: Type[T], stream: "SupportsWrite[bytes]"
+    ) -> "MessageWriter[T]":
+        """
+        Get a writer writing a message of this class to the stream field by field,
+        without creating the message. Huge repeated fields can be written one value
+        at a time, in bounded memory:
 
-            if value == self._get_field_default(field_name) and not (
-                selected_in_group or serialize_empty or include_default_value_for_oneof
-            ):
-                # Default (zero) values are not serialized. Two exceptions are
-                # if this is the selected oneof item or if we know we have to
-                # serialize an empty message (i.e. zero value was explicitly
-                # set by the user).
-                continue
+        .. code-block:: python
 
-            if isinstance(value, list):
-                if meta.proto_type in PACKED_TYPES:
-                    # Packed lists look like a length-delimited field. First,
-                    # preprocess/encode each value into a buffer and then
-                    # treat it like a field of raw bytes.
-                    buf = bytearray()
-                    for item in value:
-                        buf += _preprocess_single(meta.proto_type, "", item)
-                    stream.write(_serialize_single(meta.number, TYPE_BYTES, buf))
-                else:
-                    for item in value:
-                        stream.write(
-                            _serialize_single(
-                                meta.number,
-                                meta.proto_type,
-                                item,
-                                wraps=meta.wraps or "",
-                                serialize_empty=True,
-                            )
-                            # if it's an empty message it still needs to be represented
-                            # as an item in the repeated list
-                            or b"\n\x00"
-                        )
+            with Export.stream_writer(stream) as writer:
+                writer.write_field("header", header)
+                for item in items:
+                    writer.append("items", item)
 
-            elif isinstance(value, dict):
-                for k, v in value.items():
-                    assert meta.map_types
-                    sk = _serialize_single(1, meta.map_types[0], k)
-                    sv = _serialize_single(2, meta.map_types[1], v)
-                    stream.write(
-                        _serialize_single(meta.number, meta.proto_type, sk + sv)
-                    )
-            else:
-                # If we have an empty string and we're including the default value for
-                # a oneof, make sure we serialize it. This ensures that the byte string
-                # output isn't simply an empty string. This also ensures that round trip
-                # serialization will keep `which_one_of` calls consistent.
-                if (
-                    isinstance(value, str)
-                    and value == ""
-                    and include_default_value_for_oneof
-                ):
-                    serialize_empty = True
+        Parameters
+        -----------
+        stream: :class:`BinaryIO`
+            The stream to write the message to.
 
-                stream.write(
-                    _serialize_single(
-                        meta.number,
-                        meta.proto_type,
-                        value,
-                        serialize_empty=serialize_empty or bool(selected_in_group),
-                        wraps=meta.wraps or "",
-                    )
-                )
+        Returns
+        --------
+        :class:`~betterproto.stream.MessageWriter`
+            The writer, which must be flushed once all the fields are written.
+        """
+        from .stream import MessageWriter
 
-        stream.write(self._unknown_fields)
+        return MessageWriter(cls, stream)
 
     def __bytes__(self) -> bytes:
         """
         Get the binary encoded Protobuf representation of this message instance.
         """
-        with BytesIO() as stream:
-            self.dump(stream)
-            return stream.getvalue()
+        output = bytearray()
+        self._betterproto.encoder(self, output, {})
+        return bytes(output)
 
-    def __len__(self) -> int:
+    def serialize_append(self, buffer: bytearray) -> int:
         """
-        Get the size of the encoded Protobuf representation of this message instance.
+        Appends the binary encoded Protobuf representation of this message instance
+        to the end of the buffer. This allows reusing a single growing buffer to
+        serialize many messages.
+
+        Parameters
+        -----------
+        buffer: :class:`bytearray`
+            The buffer to append the message to.
+
+        Returns
+        --------
+        :class:`int`
+            The number of bytes written.
         """
-        size = 0
-        for field_name, meta in self._betterproto.meta_by_field_name.items():
-            try:
-                value = getattr(self, field_name)
-            except AttributeError:
-                continue
+        start = len(buffer)
+        self._betterproto.encoder(self, buffer, {})
+        return len(buffer) - start
 
-            if value is None:
-                # Optional items should be skipped. This is used for the Google
-                # wrapper types and proto3 field presence/optional fields.
-                continue
+    def serialize_into(
+        self, buffer: Union[bytearray, memoryview], offset: int = 0
+    ) -> int:
+        """
+        Writes the binary encoded Protobuf representation of this message instance
+        into the buffer, starting at ``offset``.
 
-            # Being selected in a group means this field is the one that is
-            # currently set in a `oneof` group, so it must be serialized even
-            # if the value is the default zero value.
-            #
-            # Note that proto3 field presence/optional fields are put in a
-            # synthetic single-item oneof by protoc, which helps us ensure we
-            # send the value even if the value is the default zero value.
-            selected_in_group = bool(meta.group)
-
-            # Empty messages can still be sent on the wire if they were
-            # set (or received empty).
-            serialize_empty = isinstance(value, Message) and value._serialized_on_wire
-
-            include_default_value_for_oneof = self._include_default_value_for_oneof(
-                field_name=field_name, meta=meta
-            )
+        A :class:`bytearray` is grown as needed, but a :class:`memoryview` must be
+        writable and large enough to hold the message, use ``len(message)`` to get
+        the required size.
 
-            if value == self._get_field_default(field_name) and not (
-                selected_in_group or serialize_empty or include_default_value_for_oneof
-            ):
-                # Default (zero) values are not serialized. Two exceptions are
-                # if this is the selected oneof item or if we know we have to
-                # serialize an empty message (i.e. zero value was explicitly
-                # set by the user).
-                continue
+        Parameters
+        -----------
+        buffer: Union[:class:`bytearray`, :class:`memoryview`]
+            The buffer to write the message to.
+        offset: :class:`int`
+            The position in the buffer to write the message at.
 
-            if isinstance(value, list):
-                if meta.proto_type in PACKED_TYPES:
-                    # Packed lists look like a length-delimited field. First,
-                    # preprocess/encode each value into a buffer and then
-                    # treat it like a field of raw bytes.
-                    buf = bytearray()
-                    for item in value:
-                        buf += _preprocess_single(meta.proto_type, "", item)
-                    size += _len_single(meta.number, TYPE_BYTES, buf)
-                else:
-                    for item in value:
-                        size += (
-                            _len_single(
-                                meta.number,
-                                meta.proto_type,
-                                item,
-                                wraps=meta.wraps or "",
-                                serialize_empty=True,
-                            )
-                            # if it's an empty message it still needs to be represented
-                            # as an item in the repeated list
-                            or 2
-                        )
+        Returns
+        --------
+        :class:`int`
+            The number of bytes written.
 
-            elif isinstance(value, dict):
-                for k, v in value.items():
-                    assert meta.map_types
-                    sk = _serialize_single(1, meta.map_types[0], k)
-                    sv = _serialize_single(2, meta.map_types[1], v)
-                    size += _len_single(meta.number, meta.proto_type, sk + sv)
-            else:
-                # If we have an empty string and we're including the default value for
-                # a oneof, make sure we serialize it. This ensures that the byte string
-                # output isn't simply an empty string. This also ensures that round trip
-                # serialization will keep `which_one_of` calls consistent.
-                if (
-                    isinstance(value, str)
-                    and value == ""
-                    and include_default_value_for_oneof
-                ):
-                    serialize_empty = True
-
-                size += _len_single(
-                    meta.number,
-                    meta.proto_type,
-                    value,
-                    serialize_empty=serialize_empty or bool(selected_in_group),
-                    wraps=meta.wraps or "",
-                )
+        Raises
+        -------
+        :class:`ValueError`
+            The offset is outside of the buffer or the message does not fit in it.
+        """
+        if isinstance(buffer, memoryview):
+            # Offsets are in bytes, whatever the format of the view.
+            buffer = buffer.cast("B")
+        size = len(buffer)
+        if not 0 <= offset <= size:
+            raise ValueError(
+                f"Offset {offset} is out of range for a buffer of size {size}"
+            )
+        if isinstance(buffer, bytearray) and offset == size:
+            return self.serialize_append(buffer)
 
-        size += len(self._unknown_fields)
-        return size
+        output = bytearray()
+        self._betterproto.encoder(self, output, {})
+        end = offset + len(output)
+        if isinstance(buffer, memoryview) and end > size:
+            raise ValueError(
+                f"Message of size {len(output)} does not fit in the buffer at "
+                f"offset {offset}, only {size - offset} bytes are left"
+            )
+        buffer[offset:end] = output
+        return len(output)
+
+    def __len__(self) -> int:
+        """
+        Get the size of the encoded Protobuf representation of this message instance.
+        """
+        return self._betterproto.sizer(self, {})
 
     # For compatibility with other libraries
     def SerializeToString(self: T) -> bytes:
@@ -1191,50 +2827,6 @@ class Message(ABC):
             # it should result in its zero value.
             return t
 
-    def _postprocess_single(
-        self, wire_type: int, meta: FieldMetadata, field_name: str, value: Any
-    ) -> Any:
-        """Adjusts values after parsing."""
-        if wire_type == WIRE_VARINT:
-            if meta.proto_type in (TYPE_INT32, TYPE_INT64):
-                bits = int(meta.proto_type[3:])
-                value = value & ((1 << bits) - 1)
-                signbit = 1 << (bits - 1)
-                value = int((value ^ signbit) - signbit)
-            elif meta.proto_type in (TYPE_SINT32, TYPE_SINT64):
-                # Undo zig-zag encoding
-                value = (value >> 1) ^ (-(value & 1))
-            elif meta.proto_type == TYPE_BOOL:
-                # Booleans use a varint encoding, so convert it to true/false.
-                value = value > 0
-            elif meta.proto_type == TYPE_ENUM:
-                # Convert enum ints to python enum instances
-                value = self._betterproto.cls_by_field[field_name].try_value(value)
-        elif wire_type in (WIRE_FIXED_32, WIRE_FIXED_64):
-            fmt = _pack_fmt(meta.proto_type)
-            value = struct.unpack(fmt, value)[0]
-        elif wire_type == WIRE_LEN_DELIM:
-            if meta.proto_type == TYPE_STRING:
-                value = str(value, "utf-8")
-            elif meta.proto_type == TYPE_MESSAGE:
-                cls = self._betterproto.cls_by_field[field_name]
-
-                if cls == datetime:
-                    value = _Timestamp().parse(value).to_datetime()
-                elif cls == timedelta:
-                    value = _Duration().parse(value).to_timedelta()
-                elif meta.wraps:
-                    # This is a Google wrapper value message around a single
-                    # scalar type.
-                    value = _get_wrapper(meta.wraps)().parse(value).value
-                else:
-                    value = cls().parse(value)
-                    value._serialized_on_wire = True
-            elif meta.proto_type == TYPE_MAP:
-                value = self._betterproto.cls_by_field[field_name]().parse(value)
-
-        return value
-
     def _include_default_value_for_oneof(
         self, field_name: str, meta: FieldMetadata
     ) -> bool:
@@ -1269,95 +2861,154 @@ class Message(ABC):
         if size == SIZE_DELIMITED:
             size, _ = load_varint(stream)
 
-        # Got some data over the wire
-        self._serialized_on_wire = True
-        proto_meta = self._betterproto
-        read = 0
-        for parsed in load_fields(stream):
-            field_name = proto_meta.field_name_by_number.get(parsed.number)
-            if not field_name:
-                self._unknown_fields += parsed.raw
-                continue
-
-            meta = proto_meta.meta_by_field_name[field_name]
-
-            value: Any
-            if parsed.wire_type == WIRE_LEN_DELIM and meta.proto_type in PACKED_TYPES:
-                # This is a packed repeated field.
-                pos = 0
-                value = []
-                while pos < len(parsed.value):
-                    if meta.proto_type in (TYPE_FLOAT, TYPE_FIXED32, TYPE_SFIXED32):
-                        decoded, pos = parsed.value[pos : pos + 4], pos + 4
-                        wire_type = WIRE_FIXED_32
-                    elif meta.proto_type in (TYPE_DOUBLE, TYPE_FIXED64, TYPE_SFIXED64):
-                        decoded, pos = parsed.value[pos : pos + 8], pos + 8
-                        wire_type = WIRE_FIXED_64
-                    else:
-                        decoded, pos = decode_varint(parsed.value, pos)
-                        wire_type = WIRE_VARINT
-                    decoded = self._postprocess_single(
-                        wire_type, meta, field_name, decoded
+        if size is None:
+            data = stream.read()
+        else:
+            data = stream.read(size)
+            while len(data) < size:
+                chunk = stream.read(size - len(data))
+                if not chunk:
+                    raise ValueError(
+                        f"Expected message of size {size}, but was only able to "
+                        f"read {len(data)} bytes - the stream may have ended too "
+                        "soon, or the expected size may have been incorrect."
                     )
-                    value.append(decoded)
-            else:
-                value = self._postprocess_single(
-                    parsed.wire_type, meta, field_name, parsed.value
-                )
+                data += chunk
 
-            try:
-                current = getattr(self, field_name)
-            except AttributeError:
-                current = self._get_field_default(field_name)
-                setattr(self, field_name, current)
+        return _parse_loaded(self, data, size)
 
-            if meta.proto_type == TYPE_MAP:
-                # Value represents a single key/value pair entry in the map.
-                current[value.key] = value.value
-            elif isinstance(current, list) and not isinstance(value, list):
-                current.append(value)
-            else:
-                setattr(self, field_name, value)
+    async def load_async(
+        self: T,
+        reader: "asyncio.StreamReader",
+        size: Optional[int] = None,
+    ) -> T:
+        """
+        Load the binary encoded Protobuf from an asyncio stream into this message
+        instance. This returns the instance itself and is therefore assignable and
+        chainable.
 
-            # If we have now loaded the expected length of the message, stop
-            if size is not None:
-                prev = read
-                read += len(parsed.raw)
-                if read == size:
-                    break
-                elif read > size:
-                    raise ValueError(
-                        f"Expected message of size {size}, can only read "
-                        f"either {prev} or {read} bytes - there is no "
-                        "message of the expected size in the stream."
-                    )
+        Parameters
+        -----------
+        reader: :class:`asyncio.StreamReader`
+            The stream to load the message from.
+        size: :class:`Optional[int]`
+            The size of the message in the stream.
+            Reads stream until EOF if ``None`` is given.
+            Reads based on a size delimiter prefix varint if SIZE_DELIMITED is given.
 
-        if size is not None and read < size:
-            raise ValueError(
-                f"Expected message of size {size}, but was only able to "
-                f"read {read} bytes - the stream may have ended too soon,"
-                " or the expected size may have been incorrect."
-            )
+        Returns
+        --------
+        :class:`Message`
+            The initialized message.
+        """
+        if size == SIZE_DELIMITED:
+            size = await _load_varint_async(reader)
+            if size is None:
+                raise EOFError(
+                    "Stream ended unexpectedly while attempting to load varint."
+                )
 
-        return self
+        if size is None:
+            data = await reader.read()
+        else:
+            data = await _read_exactly_async(reader, size)
+        return _parse_loaded(self, data, size)
 
-    def parse(self: T, data: bytes) -> T:
+    def parse(
+        self: T,
+        data: bytes,
+        *,
+        lazy: bool = False,
+        only: Optional[Iterable[str]] = None,
+        keep_skipped: bool = False,
+        zero_copy: bool = False,
+    ) -> T:
         """
         Parse the binary encoded Protobuf into this message instance. This
         returns the instance itself and is therefore assignable and chainable.
 
         Parameters
         -----------
-        data: :class:`bytes`
+        data: Union[:class:`bytes`, :class:`bytearray`, :class:`memoryview`]
             The data to parse the message from.
+        lazy: :class:`bool`
+            Whether to defer parsing the (non-repeated) message fields, at any depth,
+            until they are accessed. Message fields that are never accessed are
+            serialized again byte for byte as they were received, and errors in
+            their data are only raised when they are accessed. Messages of classes
+            defined with ``lazy=True`` are always parsed lazily.
+        only: Optional[Iterable[:class:`str`]]
+            The names of the fields to parse, as dotted paths for fields of nested
+            messages (e.g. ``{"header", "payload.id"}``). All the other fields are
+            skipped without being decoded, and are left unset.
+        keep_skipped: :class:`bool`
+            Whether to keep the fields skipped because of ``only`` as unknown fields,
+            so that they are serialized again.
+        zero_copy: :class:`bool`
+            Whether ``bytes`` fields, at any depth, are :class:`memoryview` slices of
+            ``data`` instead of copies. The slices reference ``data`` and keep it
+            alive for as long as they exist: changes to a mutable buffer (such as a
+            :class:`bytearray` or an :class:`mmap.mmap`) show up in the values of the
+            fields, and the buffer can't be resized or closed while they exist. Call
+            :class:`bytes` on a value to get a copy that is independent of ``data``.
 
         Returns
         --------
         :class:`Message`
             The initialized message.
         """
-        with BytesIO(data) as stream:
-            return self.load(stream)
+        if zero_copy or data.__class__ is not bytes:
+            data = memoryview(data).cast("B")
+        decoder = self._betterproto.decoder_for(lazy, zero_copy, only, keep_skipped)
+        try:
+            decoder(self, data, 0, len(data))
+        except (EOFError, IndexError):
+            raise _truncated(self) from None
+        return self
+
+    @classmethod
+    def iter_repeated(
+        cls,
+        data: Union["ReadableBuffer", "SupportsRead[bytes]"],
+        name: str,
+        rest: Optional["Message"] = None,
+    ) -> Iterator[Any]:
+        """
+        Iterate over the values of a repeated field in the binary encoded Protobuf
+        of a message of this class, decoding one value at a time instead of
+        parsing the whole message. The other fields are skipped, or parsed into
+        ``rest`` once the iteration is done.
+
+        Parameters
+        -----------
+        data: Union[:class:`bytes`, :class:`memoryview`, :class:`BinaryIO`]
+            The data of the message, or a stream to read it from until EOF.
+        name: :class:`str`
+            The name of the repeated (or map) field.
+        rest: Optional[:class:`Message`]
+            A message of this class to parse the other fields into.
+
+        Yields
+        -------
+        Any
+            The values of the field, ``(key, value)`` tuples for a map field.
+
+        Raises
+        -------
+        :class:`ValueError`
+            The class has no repeated field with this name, or the data is not a
+            valid message.
+        """
+        try:
+            field = cls._betterproto.plan.by_name[name]
+        except KeyError:
+            raise ValueError(f"{cls.__name__} has no field {name!r}") from None
+        if not field.repeated and field.proto_type != TYPE_MAP:
+            raise ValueError(
+                f"Field {name!r} of {cls.__name__} is not a repeated or map field"
+            )
+
+        return _iter_repeated(cls, field, data, rest)
 
     # For compatibility with other libraries.
     @classmethod
@@ -1875,7 +3526,11 @@ Message.__annotations__ = {}  # HACK to avoid typing.get_type_hints breaking :)
 try:
     import betterproto_rust_codec
 
-    def __parse_patch(self: T, data: bytes) -> T:
+    __parse = Message.parse
+
+    def __parse_patch(self: T, data: bytes, **kwargs: Any) -> T:
+        if kwargs:
+            return __parse(self, data, **kwargs)
         betterproto_rust_codec.deserialize(self, data)
         return self
 
@@ -1902,6 +3557,25 @@ def serialized_on_wire(message: Message) -> bool:
     return message._serialized_on_wire
 
 
+def unknown_fields(message: Message) -> UnknownFields:
+    """
+    The fields of a message that are not known by its class. They are kept when
+    the message is serialized again, including the fields appended to the
+    returned :class:`UnknownFields`.
+
+    Returns
+    --------
+    :class:`UnknownFields`
+        The unknown fields of the message, which are empty if no unknown field
+        was parsed into it.
+    """
+    fields = message._unknown_fields
+    if fields.__class__ is not UnknownFields:
+        # Messages share empty bytes until an unknown field is set.
+        fields = message._unknown_fields = UnknownFields(fields)
+    return fields
+
+
 def which_one_of(message: Message, group_name: str) -> Tuple[str, Optional[Any]]:
     """
     Return the name and value of a message's one-of field group.
@@ -1917,6 +3591,24 @@ def which_one_of(message: Message, group_name: str) -> Tuple[str, Optional[Any]]
     return field_name, getattr(message, field_name)
 
 
+def message_plan(message: Union[Message, Type[Message]]) -> MessagePlan:
+    """
+    Get the read-only plan used to encode and decode a message class, with the
+    precomputed tag, wire type, encoder and decoder of each field.
+
+    Parameters
+    -----------
+    message: Union[:class:`Message`, Type[:class:`Message`]]
+        The message class, or an instance of it.
+
+    Returns
+    --------
+    :class:`MessagePlan`
+        The plan of the message class.
+    """
+    return message._betterproto.plan
+
+
 # Circular import workaround: google.protobuf depends on base classes defined above.
 from .lib.google.protobuf import (  # noqa
     BoolValue,
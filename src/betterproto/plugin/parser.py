@@ -104,6 +104,9 @@ def generate_code(request: CodeGeneratorRequest) -> CodeGeneratorResponse:
                 output_package_name
             ].pydantic_dataclasses = True
 
+        if "slots" in plugin_options:
+            request_data.output_packages[output_package_name].slots = True
+
         # Gather any typing generation options.
         typing_opts = [
             opt[len("typing.") :] for opt in plugin_options if opt.startswith("typing.")
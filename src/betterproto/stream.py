@@ -0,0 +1,889 @@
+"""
+Reading and writing streams of size-delimited messages, as written by
+:meth:`Message.dump` with ``delimit=SIZE_DELIMITED``: each message is prefixed
+with a varint declaring its size.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from itertools import islice
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    overload,
+)
+
+from . import (
+    TYPE_MAP,
+    WIRE_LEN_DELIM,
+    FieldPlan,
+    Message,
+    _load_varint_async,
+    _read_exactly_async,
+    _truncated,
+    decode_varint,
+    encode_varint,
+)
+
+
+if TYPE_CHECKING:
+    import asyncio
+    from types import TracebackType
+
+    from _typeshed import (
+        ReadableBuffer,
+        StrPath,
+        SupportsRead,
+        SupportsWrite,
+    )
+
+
+__all__ = (
+    "AsyncDelimitedReader",
+    "DelimitedReader",
+    "DelimitedWriter",
+    "DelimitedFile",
+    "MessageWriter",
+    "parallel_load",
+)
+
+
+T = TypeVar("T", bound=Message)
+W = TypeVar("W", bound="_BufferedWriter")
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+DEFAULT_SHARD_SIZE = 1 << 22
+
+
+def _decode(cls: Type[T], data: "ReadableBuffer", start: int, end: int) -> T:
+    """
+    Parses a message of the class from ``data[start:end]``, without slicing the
+    data first.
+    """
+    message = cls()
+    try:
+        cls._betterproto.decoder(message, data, start, end)
+    except (EOFError, IndexError):
+        raise _truncated(cls) from None
+    return message
+
+
+class DelimitedReader(Generic[T]):
+    """
+    Iterates over the size-delimited messages of a stream, reading the stream in
+    large chunks instead of reading the size of each message byte by byte. This
+    is what makes reading from unbuffered files and sockets fast.
+
+    The messages can be of any size, the sizes and the messages are read across
+    as many chunks as needed.
+
+    .. container:: operations
+
+        .. describe:: iter(x)
+
+            Returns the reader itself, the messages are read from the stream as
+            they are iterated over.
+
+    Parameters
+    -----------
+    stream: :class:`BinaryIO`
+        The stream to read from. Its ``read`` method may return fewer bytes than
+        asked for, it is only considered finished when it returns no bytes.
+    cls: Type[:class:`Message`]
+        The message class of the messages.
+    chunk_size: :class:`int`
+        The number of bytes asked for on each read of the stream.
+
+    Raises
+    -------
+    :class:`ValueError`
+        While iterating, if the stream ends in the middle of a message or
+        contains a message that is not valid.
+    """
+
+    __slots__ = ("stream", "cls", "chunk_size", "_buffer", "_pos")
+
+    def __init__(
+        self,
+        stream: "SupportsRead[bytes]",
+        cls: Type[T],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.stream = stream
+        self.cls = cls
+        self.chunk_size = chunk_size
+        self._buffer = b""
+        self._pos = 0
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.cls.__name__} of {self.stream!r}>"
+
+    def __iter__(self) -> Iterator[T]:
+        return self
+
+    def __next__(self) -> T:
+        buffer = self._buffer
+        pos = self._pos
+        needed = 1
+        while True:
+            try:
+                size, start = decode_varint(buffer, pos)
+            except EOFError:
+                # The size is cut off by the end of the buffer
+                needed = len(buffer) - pos + 1
+            else:
+                end = start + size
+                if end <= len(buffer):
+                    self._pos = end
+                    return _decode(self.cls, buffer, start, end)
+                needed = end - pos
+
+            buffer = self._fill(needed)
+            pos = 0
+            if len(buffer) < needed:
+                if buffer:
+                    raise _truncated(self.cls)
+                raise StopIteration
+
+    def _fill(self, needed: int) -> bytes:
+        """
+        Reads from the stream until at least ``needed`` bytes past the current
+        position are buffered or the stream ends, and returns the new buffer.
+        """
+        rest = self._buffer[self._pos :]
+        chunks = [rest] if rest else []
+        buffered = len(rest)
+        while buffered < needed:
+            chunk = self.stream.read(max(self.chunk_size, needed - buffered))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            buffered += len(chunk)
+
+        if len(chunks) == 1 and chunks[0].__class__ is bytes:
+            buffer = chunks[0]
+        else:
+            buffer = b"".join(chunks)
+        self._buffer = buffer
+        self._pos = 0
+        return buffer
+
+
+class AsyncDelimitedReader(Generic[T]):
+    """
+    Asynchronously iterates over the size-delimited messages of an asyncio
+    stream. The sizes and the messages are read with
+    :meth:`asyncio.StreamReader.readexactly`, without blocking the event loop.
+
+    .. container:: operations
+
+        .. describe:: async for message in x
+
+            Reads the messages from the stream as they are iterated over, until
+            the stream ends.
+
+    Parameters
+    -----------
+    reader: :class:`asyncio.StreamReader`
+        The stream to read from.
+    cls: Type[:class:`Message`]
+        The message class of the messages.
+
+    Raises
+    -------
+    :class:`ValueError`
+        While iterating, if the stream ends in the middle of a message or
+        contains a message that is not valid.
+    """
+
+    __slots__ = ("reader", "cls")
+
+    def __init__(self, reader: "asyncio.StreamReader", cls: Type[T]):
+        self.reader = reader
+        self.cls = cls
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.cls.__name__} of {self.reader!r}>"
+
+    def __aiter__(self) -> AsyncDelimitedReader[T]:
+        return self
+
+    async def __anext__(self) -> T:
+        try:
+            size = await _load_varint_async(self.reader)
+        except EOFError:
+            raise _truncated(self.cls) from None
+        if size is None:
+            raise StopAsyncIteration
+        data = await _read_exactly_async(self.reader, size)
+        return _decode(self.cls, data, 0, size)
+
+
+def _write_all(stream: "SupportsWrite[bytes]", data: bytearray) -> None:
+    """
+    Writes all of ``data`` to the stream, writing again the rest of the data if a
+    raw stream only writes a part of it. Raises :class:`OSError` if the stream
+    writes nothing, rather than retrying forever.
+    """
+    with memoryview(data) as view:
+        while view:
+            written = stream.write(view)
+            if written is None or written >= len(view):
+                break
+            if written == 0:
+                raise OSError(
+                    f"The stream wrote no data, {len(view)} bytes were not written"
+                )
+            view = view[written:]
+
+
+class _BufferedWriter:
+    """
+    The base class of the writers, which write their output to a stream in large
+    blocks.
+    """
+
+    __slots__ = ("stream", "flush_threshold", "_buffer")
+
+    def __init__(self, stream: "SupportsWrite[bytes]", flush_threshold: int):
+        self.stream = stream
+        self.flush_threshold = flush_threshold
+        self._buffer = bytearray()
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} of {self.stream!r}>"
+
+    def __enter__(self: W) -> W:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.flush()
+
+    @property
+    def buffered(self) -> int:
+        """:class:`int`: The number of bytes waiting to be written to the stream."""
+        return len(self._buffer)
+
+    def _write_buffer(self) -> None:
+        if self._buffer:
+            # The stream may keep a reference to the written buffer.
+            buffer, self._buffer = self._buffer, bytearray()
+            _write_all(self.stream, buffer)
+
+    def flush(self) -> None:
+        """
+        Write the buffered data to the stream, and flush the stream if it has a
+        ``flush`` method.
+        """
+        self._write_buffer()
+        flush = getattr(self.stream, "flush", None)
+        if flush is not None:
+            flush()
+
+
+class DelimitedWriter(_BufferedWriter):
+    """
+    Writes size-delimited messages to a stream. The messages are encoded into an
+    internal buffer, which is written to the stream in a single call whenever it
+    reaches ``flush_threshold`` bytes, instead of making a write call for each
+    message.
+
+    The written data is the same as if each message was written with
+    :meth:`Message.dump` and ``delimit=SIZE_DELIMITED``, and can be read back with
+    :class:`DelimitedReader`.
+
+    The writer can be used as a context manager, it is flushed on exit. The
+    stream isn't closed.
+
+    Parameters
+    -----------
+    stream: :class:`BinaryIO`
+        The stream to write to.
+    flush_threshold: :class:`int`
+        The number of buffered bytes from which the buffer is written to the
+        stream.
+    """
+
+    __slots__ = ()
+
+    def __init__(
+        self,
+        stream: "SupportsWrite[bytes]",
+        flush_threshold: int = DEFAULT_CHUNK_SIZE,
+    ):
+        super().__init__(stream, flush_threshold)
+
+    def write(self, message: Message) -> int:
+        """
+        Write a message, prefixed with its size.
+
+        Parameters
+        -----------
+        message: :class:`Message`
+            The message to write.
+
+        Returns
+        --------
+        :class:`int`
+            The number of bytes written, including the size prefix.
+        """
+        buffer = self._buffer
+        start = len(buffer)
+        type(message)._betterproto.encoder(message, buffer, {})
+        buffer[start:start] = encode_varint(len(buffer) - start)
+        written = len(buffer) - start
+        if len(buffer) >= self.flush_threshold:
+            self._write_buffer()
+        return written
+
+    def write_all(self, messages: Iterable[Message]) -> None:
+        """
+        Write messages, each prefixed with its size.
+
+        Parameters
+        -----------
+        messages: Iterable[:class:`Message`]
+            The messages to write.
+        """
+        for message in messages:
+            self.write(message)
+
+
+class MessageWriter(_BufferedWriter, Generic[T]):
+    """
+    Writes a single message to a stream field by field, without creating the
+    message. This allows writing messages with huge repeated fields in bounded
+    memory, appending the values of the repeated fields one at a time. Create it
+    with :meth:`Message.stream_writer`.
+
+    The fields are written in the order of the calls, and are encoded as the
+    fields of the message class. Packed repeated fields are written as packed
+    fields, split in blocks of about ``flush_threshold`` bytes, which parsers
+    join together. A non-repeated field written more than once is parsed as its
+    last value.
+
+    The message is written without a size prefix, and can be parsed with
+    :meth:`Message.parse` or :meth:`Message.load`. The writer must be flushed once
+    all the fields are written, it is flushed on exit when used as a context
+    manager. The stream isn't closed.
+
+    Parameters
+    -----------
+    cls: Type[:class:`Message`]
+        The message class of the message.
+    stream: :class:`BinaryIO`
+        The stream to write to.
+    flush_threshold: :class:`int`
+        The number of buffered bytes from which the buffer is written to the
+        stream.
+    """
+
+    __slots__ = ("cls", "_packed_field", "_packed")
+
+    def __init__(
+        self,
+        cls: Type[T],
+        stream: "SupportsWrite[bytes]",
+        flush_threshold: int = DEFAULT_CHUNK_SIZE,
+    ):
+        super().__init__(stream, flush_threshold)
+        self.cls = cls
+        self._packed_field: Optional[FieldPlan] = None
+        self._packed = bytearray()
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.cls.__name__} of {self.stream!r}>"
+
+    def _get_field(self, name: str) -> FieldPlan:
+        try:
+            return self.cls._betterproto.plan.by_name[name]
+        except KeyError:
+            raise ValueError(f"{self.cls.__name__} has no field {name!r}") from None
+
+    def _end_packed(self) -> None:
+        """Writes the values appended to the current packed field."""
+        field = self._packed_field
+        if field is not None:
+            packed = self._packed
+            self._buffer += encode_varint(field.number << 3 | WIRE_LEN_DELIM)
+            self._buffer += encode_varint(len(packed))
+            self._buffer += packed
+            packed.clear()
+            self._packed_field = None
+
+    def write_field(self, name: str, value: Any) -> None:
+        """
+        Write the value of a field, as it is encoded in a message of the class
+        with only this field set. Default values of fields that are not optional
+        or part of a ``oneof`` are not written.
+
+        Parameters
+        -----------
+        name: :class:`str`
+            The name of the field.
+        value: Any
+            The value of the field, e.g. a :class:`list` for a repeated field.
+
+        Raises
+        -------
+        :class:`ValueError`
+            The message class has no field with this name.
+        """
+        self._get_field(name)
+        self._end_packed()
+        message = self.cls()
+        setattr(message, name, value)
+        self.cls._betterproto.encoder(message, self._buffer, {})
+        if len(self._buffer) >= self.flush_threshold:
+            self._write_buffer()
+
+    def append(self, name: str, value: Any) -> None:
+        """
+        Write a value of a repeated field.
+
+        Parameters
+        -----------
+        name: :class:`str`
+            The name of the field.
+        value: Any
+            The value to append to the field, a ``(key, value)`` tuple for map
+            fields.
+
+        Raises
+        -------
+        :class:`ValueError`
+            The message class has no repeated or map field with this name.
+        """
+        field = self._get_field(name)
+        if not field.repeated and field.proto_type != TYPE_MAP:
+            raise ValueError(
+                f"Field {name!r} of {self.cls.__name__} is not a repeated or map "
+                "field"
+            )
+
+        encoded = field.encode(value)
+        if field.packed:
+            if self._packed_field is not field:
+                self._end_packed()
+                self._packed_field = field
+            self._packed += encoded[len(field.tag) :]
+            if len(self._packed) >= self.flush_threshold:
+                self._end_packed()
+        else:
+            self._end_packed()
+            self._buffer += encoded
+        if len(self._buffer) >= self.flush_threshold:
+            self._write_buffer()
+
+    def extend(self, name: str, values: Iterable[Any]) -> None:
+        """
+        Write values of a repeated field.
+
+        Parameters
+        -----------
+        name: :class:`str`
+            The name of the field.
+        values: Iterable[Any]
+            The values to append to the field, ``(key, value)`` tuples for map
+            fields.
+
+        Raises
+        -------
+        :class:`ValueError`
+            The message class has no repeated or map field with this name.
+        """
+        for value in values:
+            self.append(name, value)
+
+    def flush(self) -> None:
+        """
+        Write the buffered fields to the stream, and flush the stream if it has a
+        ``flush`` method.
+        """
+        self._end_packed()
+        super().flush()
+
+
+def _index_records(data: "ReadableBuffer", end: int) -> "array[int]":
+    """
+    Returns the offsets of the size-delimited records in ``data[:end]``, reading
+    only their size prefixes, followed by ``end``.
+    """
+    offsets = array("Q")
+    append = offsets.append
+    pos = 0
+    try:
+        while pos < end:
+            append(pos)
+            size, pos = decode_varint(data, pos)
+            pos += size
+    except EOFError:
+        pos = end + 1
+    if pos > end:
+        raise ValueError("Unexpected end of data while indexing delimited records")
+    append(end)
+    return offsets
+
+
+def _load_index(path: "StrPath", stamp: Tuple[int, int]) -> Optional["array[int]"]:
+    """
+    Loads the offsets saved by :meth:`DelimitedFile.save_index`, or returns
+    ``None`` if the file does not exist or is not the index of the file with the
+    size and modification time in ``stamp``.
+    """
+    offsets = array("Q")
+    try:
+        with open(path, "rb") as stream:
+            offsets.frombytes(stream.read())
+    except (FileNotFoundError, ValueError):
+        return None
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    # The index starts with the size and modification time of its file.
+    if len(offsets) < 3 or tuple(offsets[:2]) != stamp:
+        return None
+    del offsets[:2]
+    if offsets[0] != 0 or offsets[-1] != stamp[0]:
+        return None
+    return offsets
+
+
+class DelimitedFile(Sequence[T]):
+    """
+    A file of size-delimited messages, as written by :class:`DelimitedWriter`,
+    accessed by index. The file is memory-mapped and indexed by reading only the
+    size prefixes of the messages, so a message is decoded only when it is
+    accessed.
+
+    The index can be saved to a sidecar file with ``index_path``, so that
+    reopening the file does not read it again. The sidecar file is created if it
+    does not exist, and recreated if the size or the modification time of the
+    file changed since it was saved (e.g. the file was appended to).
+
+    .. container:: operations
+
+        .. describe:: len(x)
+
+            Returns the number of messages in the file.
+
+        .. describe:: x[i]
+
+            Decodes and returns the message at index ``i``. Negative indices
+            count from the end.
+
+        .. describe:: x[i:j]
+
+            Decodes and returns a :class:`list` of the messages in the slice,
+            without decoding the other messages.
+
+        .. describe:: iter(x)
+
+            Returns an iterator decoding the messages in order.
+
+    The file should be closed with :meth:`close`, or by using it as a context
+    manager.
+
+    Parameters
+    -----------
+    path: Union[:class:`str`, :class:`os.PathLike`]
+        The path of the file.
+    cls: Type[:class:`Message`]
+        The message class of the messages.
+    index_path: Optional[Union[:class:`str`, :class:`os.PathLike`]]
+        The path of the sidecar file holding the index.
+
+    Raises
+    -------
+    :class:`ValueError`
+        The file ends in the middle of a message.
+    """
+
+    __slots__ = ("path", "cls", "_mmap", "_view", "_offsets", "_stamp")
+
+    def __init__(
+        self,
+        path: "StrPath",
+        cls: Type[T],
+        index_path: Optional["StrPath"] = None,
+    ):
+        self.path = path
+        self.cls = cls
+        with open(path, "rb") as stream:
+            stat = os.fstat(stream.fileno())
+            size = stat.st_size
+            self._stamp = (size, stat.st_mtime_ns)
+            # Empty files can't be memory-mapped.
+            self._mmap = (
+                mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+            )
+        self._view = memoryview(self._mmap if self._mmap is not None else b"")
+
+        offsets = None
+        if index_path is not None:
+            offsets = _load_index(index_path, self._stamp)
+        if offsets is not None:
+            self._offsets = offsets
+            return
+
+        try:
+            self._offsets = _index_records(self._view, size)
+            if index_path is not None:
+                self.save_index(index_path)
+        except Exception:
+            self.close()
+            raise
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} {self.cls.__name__} of {self.path!r}, "
+            f"{len(self)} messages>"
+        )
+
+    def __enter__(self) -> DelimitedFile[T]:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close the file. Messages already decoded stay valid, as their values are
+        copies of the data.
+        """
+        self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+    def save_index(self, path: "StrPath") -> None:
+        """
+        Save the index of the file to a sidecar file, for ``index_path``. The
+        size and modification time of the file when it was opened are saved with
+        it, to detect that the file changed.
+
+        Parameters
+        -----------
+        path: Union[:class:`str`, :class:`os.PathLike`]
+            The path of the sidecar file.
+        """
+        offsets = array("Q", self._stamp)
+        offsets += self._offsets
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        with open(path, "wb") as stream:
+            offsets.tofile(stream)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    @overload
+    def __getitem__(self, index: int) -> T:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[T]:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[T, List[T]]:
+        if isinstance(index, slice):
+            return [self._decode(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"{self.__class__.__name__} index out of range")
+        return self._decode(index)
+
+    def __iter__(self) -> Iterator[T]:
+        for index in range(len(self)):
+            yield self._decode(index)
+
+    def raw(self, index: int) -> memoryview:
+        """
+        Get the encoded message at an index, without decoding it.
+
+        Parameters
+        -----------
+        index: :class:`int`
+            The index of the message.
+
+        Returns
+        --------
+        :class:`memoryview`
+            A slice of the memory-mapped file holding the encoded message. It must
+            be released before the file is closed.
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"{self.__class__.__name__} index out of range")
+        start = decode_varint(self._view, self._offsets[index])[1]
+        return self._view[start : self._offsets[index + 1]]
+
+    def _decode(self, index: int) -> T:
+        view = self._view
+        start = decode_varint(view, self._offsets[index])[1]
+        return _decode(self.cls, view, start, self._offsets[index + 1])
+
+
+def _shards(offsets: "array[int]", shard_size: int) -> Iterator[Tuple[int, int]]:
+    """
+    Splits the records at ``offsets`` into ranges of about ``shard_size`` bytes,
+    starting and ending at record boundaries.
+    """
+    start = 0
+    end = offsets[-1]
+    while start < end:
+        index = bisect_left(offsets, start + shard_size)
+        stop = offsets[min(index, len(offsets) - 1)]
+        yield start, stop
+        start = stop
+
+
+def _load_shard(
+    path: "StrPath",
+    cls: Type[T],
+    start: int,
+    end: int,
+    func: Optional[Callable[[T], Any]],
+) -> List[Any]:
+    """
+    Decodes the records in the range of a file, in a worker process of
+    :func:`parallel_load`.
+    """
+    results = []
+    with open(path, "rb") as stream:
+        with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            # Decoded messages don't reference the mapping, which can be closed.
+            with memoryview(mapping) as data:
+                pos = start
+                while pos < end:
+                    size, pos = decode_varint(data, pos)
+                    message = _decode(cls, data, pos, pos + size)
+                    results.append(message if func is None else func(message))
+                    pos += size
+    return results
+
+
+def parallel_load(
+    path: "StrPath",
+    cls: Type[T],
+    workers: Optional[int] = None,
+    *,
+    ordered: bool = True,
+    func: Optional[Callable[[T], Any]] = None,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    index_path: Optional["StrPath"] = None,
+) -> Iterator[Any]:
+    """
+    Decodes the messages of a file of size-delimited messages in parallel, in a
+    :class:`~concurrent.futures.ProcessPoolExecutor`.
+
+    The file is split at message boundaries into shards of about ``shard_size``
+    bytes, using the same index as :class:`DelimitedFile`. The workers only
+    receive the offsets of their shard, and read it from their own memory
+    mapping of the file, which shares the pages of the file with the other
+    processes, so no message data is sent to them.
+
+    The decoded messages are sent back to this process pickled, which encodes
+    and parses them again. To make use of the parallelism, pass a ``func`` that
+    reduces each message to the result actually needed, so that only the results
+    are sent back. ``cls`` and ``func`` must be picklable, i.e. defined at the top
+    level of a module.
+
+    Parameters
+    -----------
+    path: Union[:class:`str`, :class:`os.PathLike`]
+        The path of the file.
+    cls: Type[:class:`Message`]
+        The message class of the messages.
+    workers: Optional[:class:`int`]
+        The number of worker processes, the number of processors by default.
+    ordered: :class:`bool`
+        Whether the results are in the order of the messages in the file.
+        Otherwise the results of each shard are yielded as soon as it is done.
+    func: Optional[Callable[[:class:`Message`], Any]]
+        A function called on each message in the workers, whose result is
+        yielded instead of the message.
+    shard_size: :class:`int`
+        The number of bytes of messages decoded by a worker at a time. Messages
+        larger than this are decoded in a shard of their own.
+    index_path: Optional[Union[:class:`str`, :class:`os.PathLike`]]
+        The path of the sidecar file holding the index, see
+        :class:`DelimitedFile`.
+
+    Yields
+    -------
+    Any
+        The messages, or the results of ``func``.
+
+    Raises
+    -------
+    :class:`ValueError`
+        The file ends in the middle of a message, or contains a message that is
+        not valid.
+    """
+    if shard_size <= 0:
+        raise ValueError("shard_size must be positive")
+    workers = workers or os.cpu_count() or 1
+
+    with DelimitedFile(path, cls, index_path) as records, ProcessPoolExecutor(
+        workers
+    ) as executor:
+        shards = _shards(records._offsets, shard_size)
+        pending: Deque[Future[List[Any]]] = deque()
+        running: Set[Future[List[Any]]] = set()
+
+        def submit(count: int) -> None:
+            for start, end in islice(shards, count):
+                future = executor.submit(_load_shard, path, cls, start, end, func)
+                if ordered:
+                    pending.append(future)
+                else:
+                    running.add(future)
+
+        # Bound the number of shards decoded ahead of the consumer.
+        submit(2 * workers)
+        while pending or running:
+            if ordered:
+                done: Iterable[Future[List[Any]]] = (pending.popleft(),)
+            else:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                submit(1)
+                yield from future.result()
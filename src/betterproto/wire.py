@@ -0,0 +1,226 @@
+"""
+Queries over the binary encoding of messages, reading single values without
+parsing whole messages.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Iterator,
+    List,
+    Tuple,
+    Type,
+)
+
+from . import (
+    TYPE_BYTES,
+    TYPE_MAP,
+    TYPE_MESSAGE,
+    WIRE_FIXED_32,
+    WIRE_FIXED_64,
+    WIRE_LEN_DELIM,
+    WIRE_VARINT,
+    FieldPlan,
+    Message,
+    _field_offsets,
+)
+
+
+if TYPE_CHECKING:
+    from _typeshed import ReadableBuffer
+
+
+__all__ = ("Extractor", "compile_path", "extract")
+
+_WIRE_TYPES = (WIRE_VARINT, WIRE_FIXED_64, WIRE_LEN_DELIM, WIRE_FIXED_32)
+
+
+def _field_ranges(
+    data: memoryview, pos: int, end: int, number: int
+) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    Yields the wire type, the position after the tag, and the positions of the
+    start and end of the value of each occurrence of the field ``number`` encoded
+    in ``data[pos:end]``. The range of a length-delimited value excludes its
+    length prefix.
+    """
+    try:
+        for tag, value_pos, start, pos in _field_offsets(data, pos, end):
+            if pos > end:
+                raise ValueError("Unexpected end of data while extracting a field")
+            if tag & 0x7 not in _WIRE_TYPES:
+                raise ValueError(f"Unsupported wire type {tag & 0x7}")
+            if tag >> 3 == number:
+                yield tag & 0x7, value_pos, start, pos
+    except EOFError:
+        # A tag or a length was cut off.
+        raise ValueError("Unexpected end of data while extracting a field") from None
+
+
+class Extractor:
+    """
+    Reads the value of a field of a message class, at a dotted path, from the
+    binary encoding of messages. Create it with :func:`compile_path`.
+
+    Only the length-delimited values of the message fields on the path are
+    descended into, and no message is created. Calling the extractor returns:
+
+    - A :class:`memoryview` slice of the data for ``bytes`` and message fields.
+      For message fields, it holds the encoded message, which can be parsed.
+    - A :class:`dict` for map fields and a :class:`list` for repeated fields.
+    - The decoded value for all other fields.
+    - ``None`` if the field is not present in the data.
+
+    As in a parsed message, the last value of a non-repeated field wins if it is
+    present multiple times.
+    """
+
+    __slots__ = ("cls", "path", "_numbers", "_field", "_view")
+
+    def __init__(self, cls: Type[Message], path: str):
+        self.cls = cls
+        self.path = path
+
+        numbers = []
+        meta = cls._betterproto
+        *parents, leaf = path.split(".")
+        for name in parents:
+            field = self._get_field(meta.cls, name)
+            field_cls = meta.cls_by_field[name]
+            if (
+                field.proto_type != TYPE_MESSAGE
+                or field.repeated
+                or meta.meta_by_field_name[name].wraps
+                or not (isinstance(field_cls, type) and issubclass(field_cls, Message))
+            ):
+                raise ValueError(
+                    f"Field {name!r} of {meta.cls.__name__} is not a non-repeated "
+                    "message field"
+                )
+            numbers.append(field.number)
+            meta = field_cls._betterproto
+
+        self._numbers = tuple(numbers)
+        self._field = field = self._get_field(meta.cls, leaf)
+        # Whether the values are returned as slices of the data
+        self._view = not field.repeated and (
+            field.proto_type == TYPE_BYTES
+            or (
+                field.proto_type == TYPE_MESSAGE
+                and not meta.meta_by_field_name[leaf].wraps
+                and isinstance(meta.cls_by_field[leaf], type)
+                and issubclass(meta.cls_by_field[leaf], Message)
+            )
+        )
+
+    @staticmethod
+    def _get_field(cls: Type[Message], name: str) -> FieldPlan:
+        try:
+            return cls._betterproto.plan.by_name[name]
+        except KeyError:
+            raise ValueError(f"{cls.__name__} has no field {name!r}") from None
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.cls.__name__}.{self.path}>"
+
+    def __call__(self, data: "ReadableBuffer") -> Any:
+        """
+        Extract the value of the field from the binary encoding of a message.
+
+        Parameters
+        -----------
+        data: Union[:class:`bytes`, :class:`bytearray`, :class:`memoryview`]
+            The encoded message.
+
+        Returns
+        --------
+        Any
+            The value of the field, or ``None`` if it is not present.
+        """
+        view = memoryview(data).cast("B")
+        ranges: List[Tuple[int, int]] = [(0, len(view))]
+        for number in self._numbers:
+            ranges = [
+                (start, end)
+                for pos, end in ranges
+                for wire_type, _, start, end in _field_ranges(view, pos, end, number)
+                if wire_type == WIRE_LEN_DELIM
+            ]
+            if not ranges:
+                return None
+
+        field = self._field
+        values = []
+        for pos, end in ranges:
+            for wire_type, value_pos, start, end in _field_ranges(
+                view, pos, end, field.number
+            ):
+                if wire_type == field.wire_type:
+                    if self._view:
+                        values.append(view[start:end])
+                    else:
+                        values.append(field.decode(view[:end], value_pos)[0])
+                elif field.packed and wire_type == WIRE_LEN_DELIM:
+                    while start < end:
+                        value, start = field.decode(view[:end], start)
+                        values.append(value)
+
+        if field.proto_type == TYPE_MAP:
+            return dict(values) if values else None
+        if field.repeated:
+            return values if values else None
+        return values[-1] if values else None
+
+
+@lru_cache(maxsize=1024)
+def compile_path(cls: Type[Message], path: str) -> Extractor:
+    """
+    Get an :class:`Extractor` reading the field at a dotted path (e.g.
+    ``"header.routing.key"``) of a message class from encoded messages. The
+    extractors are cached, reusing one directly avoids the lookup.
+
+    Parameters
+    -----------
+    cls: Type[:class:`Message`]
+        The message class of the encoded messages.
+    path: :class:`str`
+        The names of the fields leading to the field to read, separated by dots.
+        All but the last field must be non-repeated message fields.
+
+    Returns
+    --------
+    :class:`Extractor`
+        The extractor for the field.
+
+    Raises
+    -------
+    :class:`ValueError`
+        The path does not lead to a field of the message class.
+    """
+    return Extractor(cls, path)
+
+
+def extract(data: "ReadableBuffer", cls: Type[Message], path: str) -> Any:
+    """
+    Read the value of the field at a dotted path of a message class from the
+    binary encoding of a message, without parsing the message. See
+    :class:`Extractor` for the returned values.
+
+    Parameters
+    -----------
+    data: Union[:class:`bytes`, :class:`bytearray`, :class:`memoryview`]
+        The encoded message.
+    cls: Type[:class:`Message`]
+        The message class of the encoded message.
+    path: :class:`str`
+        The names of the fields leading to the field to read, separated by dots.
+
+    Returns
+    --------
+    Any
+        The value of the field, or ``None`` if it is not present.
+    """
+    return compile_path(cls, path)(data)
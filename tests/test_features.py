@@ -8,6 +8,7 @@ from dataclasses import dataclass
 from datetime import (
     datetime,
     timedelta,
+    timezone,
 )
 from inspect import (
     Parameter,
@@ -135,6 +136,60 @@ def test_unknown_fields():
     assert newer == new_again
 
 
+def test_unknown_fields_by_number():
+    @dataclass
+    class Newer(betterproto.Message):
+        foo: bool = betterproto.bool_field(1)
+        bar: int = betterproto.int32_field(2)
+        baz: str = betterproto.string_field(3)
+
+    @dataclass
+    class Older(betterproto.Message):
+        foo: bool = betterproto.bool_field(1)
+
+    data = bytes(Newer(foo=True, baz="Hello")) + b"\x10\x01\x10\x02"
+    older = Older().parse(data)
+    unknown = betterproto.unknown_fields(older)
+    assert isinstance(unknown, betterproto.UnknownFields)
+    assert unknown == b"\x1a\x05Hello\x10\x01\x10\x02"
+    assert len(unknown) == 11
+    assert 2 in unknown and 1 not in unknown
+    assert [field.value for field in unknown.get(2)] == [1, 2]
+    assert [field.value for field in unknown.get(3)] == [b"Hello"]
+    assert unknown.get(4) == []
+    assert [field.number for field in unknown] == [3, 2, 2]
+
+    # Parsing into a message again appends to the unknown fields
+    older.parse(b"\x20\x05")
+    assert [field.value for field in betterproto.unknown_fields(older).get(4)] == [5]
+    assert bytes(older) == data + b"\x20\x05"
+
+    # Messages without unknown fields have empty unknown fields
+    for message in (Older(), Older().parse(b"\x08\x01")):
+        unknown_fields = betterproto.unknown_fields(message)
+        assert unknown_fields == b""
+        assert unknown_fields.get(2) == []
+        assert 2 not in unknown_fields
+        unknown_fields += b"\x10\x03"
+        assert [field.value for field in unknown_fields.get(2)] == [3]
+        assert bytes(message).endswith(b"\x10\x03")
+    unknown += b"\x10\x03"
+    assert bytes(older) == data + b"\x20\x05\x10\x03"
+    assert betterproto.UnknownFields(b"\x10\x01") + b"\x20\x05" == b"\x10\x01\x20\x05"
+
+    # Unknown fields kept as slices of the parsed data are joined on serialize
+    older = Older().parse(data, zero_copy=True)
+    assert bytes(older) == data
+    assert betterproto.UnknownFields(bytes(unknown)) == unknown
+
+    # Otherwise they are copies, independent of a mutable parsed buffer
+    buffer = bytearray(data)
+    older = Older().parse(buffer)
+    buffer[3:8] = b"World"
+    buffer.append(0)
+    assert bytes(older) == data
+
+
 def test_oneof_support():
     @dataclass
     class Sub(betterproto.Message):
@@ -156,7 +211,7 @@ def test_oneof_support():
 
     # Other oneof fields should now be unset
     assert not hasattr(foo, "bar")
-    assert object.__getattribute__(foo, "bar") == betterproto.PLACEHOLDER
+    assert foo.__dict__["bar"] == betterproto.PLACEHOLDER
     assert betterproto.which_one_of(foo, "group1")[0] == "baz"
 
     foo.sub = Sub(val=1)
@@ -166,7 +221,7 @@ def test_oneof_support():
 
     # Group 1 shouldn't be touched, group 2 should have reset
     assert not hasattr(foo, "sub")
-    assert object.__getattribute__(foo, "sub") == betterproto.PLACEHOLDER
+    assert foo.__dict__["sub"] == betterproto.PLACEHOLDER
     assert betterproto.which_one_of(foo, "group2")[0] == "abc"
 
     # Zero value should always serialize for one-of
@@ -181,6 +236,116 @@ def test_oneof_support():
     assert betterproto.which_one_of(foo2, "group2")[0] == ""
 
 
+@pytest.mark.skipif(
+    sys.version_info < (3, 10),
+    reason="dataclasses with slots are only supported in python3.10+",
+)
+def test_slots():
+    @dataclass(eq=False, repr=False, slots=True)
+    class Sub(betterproto.Message):
+        val: int = betterproto.int32_field(1)
+
+    @dataclass(eq=False, repr=False, slots=True)
+    class Foo(betterproto.Message):
+        bar: int = betterproto.int32_field(1)
+        values: List[int] = betterproto.int32_field(2)
+        sub: Sub = betterproto.message_field(3)
+        baz: int = betterproto.int32_field(4, group="group")
+        qux: Sub = betterproto.message_field(5, group="group")
+
+    foo = Foo(bar=1, values=[1, 2], sub=Sub(val=2), baz=3)
+    assert not hasattr(foo, "__dict__")
+    assert betterproto.serialized_on_wire(foo)
+    assert repr(foo) == "Foo(bar=1, values=[1, 2], sub=Sub(val=2), baz=3)"
+
+    parsed = Foo().parse(bytes(foo) + b"\x30\x01")
+    assert parsed == foo
+    assert parsed._unknown_fields == b"\x30\x01"
+    assert Foo().parse(bytes(foo), lazy=True).sub == Sub(val=2)
+    assert Foo().from_dict(foo.to_dict()) == foo
+
+    parsed.qux = Sub()
+    assert betterproto.which_one_of(parsed, "group") == ("qux", Sub())
+    with pytest.raises(AttributeError):
+        parsed.baz
+    assert Foo().parse(bytes(parsed)).qux == Sub()
+
+    # Defaults are only set when they are accessed.
+    assert not Foo().values
+    assert not Foo()
+
+
+def test_field_setters():
+    @dataclass
+    class Empty(betterproto.Message):
+        pass
+
+    @dataclass
+    class Foo(betterproto.Message):
+        bar: int = betterproto.int32_field(1)
+        empty: Empty = betterproto.message_field(2)
+        baz: int = betterproto.int32_field(3, group="group")
+        qux: str = betterproto.string_field(4, group="group")
+
+    foo = Foo()
+    # The fields of the class now set their values without Message.__setattr__.
+    assert Foo.__setattr__ is object.__setattr__
+    assert not betterproto.serialized_on_wire(foo)
+
+    foo.bar = 0
+    assert betterproto.serialized_on_wire(foo)
+    assert foo.__dict__["bar"] == 0
+
+    foo.empty = Empty()
+    assert betterproto.serialized_on_wire(foo.empty)
+    assert bytes(Foo(empty=Empty())) == b"\x12\x00"
+
+    foo.qux = "test"
+    foo.baz = 1
+    assert foo.__dict__["qux"] is betterproto.PLACEHOLDER
+    assert betterproto.which_one_of(foo, "group") == ("baz", 1)
+
+
+def test_compiled_init():
+    @dataclass
+    class Empty(betterproto.Message):
+        pass
+
+    @dataclass
+    class Foo(betterproto.Message):
+        bar: int = betterproto.int32_field(1)
+        maybe: Optional[int] = betterproto.int32_field(2, optional=True)
+        empty: Empty = betterproto.message_field(3)
+        baz: int = betterproto.int32_field(4, group="group")
+        qux: str = betterproto.string_field(5, group="group")
+
+    @dataclass
+    class Deprecated(betterproto.Message):
+        bar: int = betterproto.int32_field(1)
+
+        def __post_init__(self) -> None:
+            super().__post_init__()
+            self.initialized = True
+
+    # The first message of each class installs its specialized __init__.
+    Foo(), Deprecated()
+    assert list(signature(Foo).parameters) == ["bar", "maybe", "empty", "baz", "qux"]
+
+    assert not betterproto.serialized_on_wire(Foo())
+    assert not betterproto.serialized_on_wire(Foo(maybe=None))
+    assert betterproto.serialized_on_wire(Foo(0))
+    assert betterproto.serialized_on_wire(Foo(maybe=0))
+
+    foo = Foo(empty=Empty(), baz=1, qux="test")
+    assert betterproto.serialized_on_wire(foo.empty)
+    assert betterproto.which_one_of(foo, "group") == ("qux", "test")
+    assert betterproto.which_one_of(Foo(), "group") == ("", None)
+    assert bytes(foo) == b"\x1a\x00\x2a\x04test"
+
+    assert Deprecated(1).initialized
+    assert betterproto.serialized_on_wire(Deprecated(bar=1))
+
+
 @pytest.mark.skipif(
     sys.version_info < (3, 10),
     reason="pattern matching is only supported in python3.10+",
@@ -680,3 +845,269 @@ def test_equality_comparison():
     assert msg == TestMessage(value=True)
     assert msg != 1
     assert msg != TestMessage(value=False)
+
+
+def test_serialize_mutated_default_message():
+    @dataclass
+    class Sub(betterproto.Message):
+        values: List[int] = betterproto.int32_field(1)
+
+    @dataclass
+    class Root(betterproto.Message):
+        sub: Sub = betterproto.message_field(1)
+        sent: datetime = betterproto.message_field(2)
+
+    root = Root()
+    assert bytes(root) == b""
+
+    # Mutating the default sub-message in place does not mark it as set, but its
+    # contents must still be serialized.
+    root.sub.values.append(1)
+    assert bytes(root) == b"\n\x03\n\x01\x01"
+
+    root = Root(sent=datetime(1970, 1, 1, 0, 0, 1, tzinfo=timezone.utc))
+    assert Root().parse(bytes(root)) == root
+
+
+def test_parse_unexpected_wire_type_as_unknown_field():
+    @dataclass
+    class Spam(betterproto.Message):
+        foo: int = betterproto.int32_field(1)
+        bar: str = betterproto.string_field(2)
+
+    # Field 2 is sent as a varint instead of a string
+    data = b"\x08\x96\x01\x10\x01"
+    spam = Spam().parse(data)
+    assert spam.foo == 150
+    assert spam.bar == ""
+    assert bytes(spam) == data
+
+
+def test_parse_truncated():
+    @dataclass
+    class Spam(betterproto.Message):
+        foo: int = betterproto.int32_field(1)
+        bar: str = betterproto.string_field(2)
+
+    data = bytes(Spam(foo=150, bar="Hello"))
+    for end in range(1, len(data)):
+        if end == 3:
+            # Stops between two fields
+            continue
+        with pytest.raises(ValueError):
+            Spam().parse(data[:end])
+
+
+def test_packed_repeated_fields():
+    @dataclass
+    class Packed(betterproto.Message):
+        doubles: List[float] = betterproto.double_field(1)
+        fixed: List[int] = betterproto.sfixed32_field(2)
+        varints: List[int] = betterproto.int32_field(3)
+        signed: List[int] = betterproto.sint64_field(4)
+        flags: List[bool] = betterproto.bool_field(5)
+
+    small = Packed(
+        doubles=[1.5, -2.25],
+        fixed=[-1, 2],
+        varints=[0, 1, 127],
+        signed=[-1, 1, 63],
+        flags=[True, False],
+    )
+    assert bytes(small) == (
+        b"\n\x10\x00\x00\x00\x00\x00\x00\xf8?\x00\x00\x00\x00\x00\x00\x02\xc0"
+        b"\x12\x08\xff\xff\xff\xff\x02\x00\x00\x00"
+        b"\x1a\x03\x00\x01\x7f"
+        b'"\x03\x01\x02~'
+        b"*\x02\x01\x00"
+    )
+    large = Packed(
+        varints=[128, -1, 5, 2**31 - 1], signed=[-(2**63), 64, 0], flags=[True]
+    )
+    for message in (small, large):
+        data = bytes(message)
+        assert len(message) == len(data)
+        assert Packed().parse(data) == message
+        assert Packed().parse(memoryview(data)) == message
+
+    # The packed fixed-width values don't fill up the field
+    with pytest.raises(ValueError):
+        Packed().parse(b"\x12\x05\x00\x00\x00\x00\x00")
+
+
+def test_message_plan():
+    @dataclass
+    class Spam(betterproto.Message):
+        foo: int = betterproto.sint32_field(1)
+        bar: List[float] = betterproto.float_field(2)
+        baz: Dict[str, int] = betterproto.map_field(
+            16, betterproto.TYPE_STRING, betterproto.TYPE_INT32
+        )
+
+    plan = betterproto.message_plan(Spam)
+    assert betterproto.message_plan(Spam()) is plan
+    assert plan.cls is Spam
+    assert [field.name for field in plan.fields] == ["foo", "bar", "baz"]
+    assert plan.by_number[16] is plan.by_name["baz"] is plan.fields[2]
+
+    foo, bar, baz = plan.fields
+    assert (foo.wire_type, foo.tag, foo.repeated) == (0, b"\x08", False)
+    assert (bar.wire_type, bar.tag, bar.packed) == (5, b"\x15", True)
+    assert (baz.wire_type, baz.tag) == (2, b"\x82\x01")
+
+    assert foo.encode(-2) == b"\x08\x03"
+    assert foo.decode(b"\x03", 0) == (-2, 1)
+    assert bar.encode(0.5) == b"\x15\x00\x00\x00\x3f"
+    assert bar.decode(b"\x00\x00\x00\x3f\x00", 0) == (0.5, 4)
+    assert baz.encode(("a", 1)) == bytes(Spam(baz={"a": 1}))
+    assert baz.decode(baz.encode(("a", 1)), 2) == (("a", 1), 8)
+
+    with pytest.raises(AttributeError):
+        foo.number = 2
+    with pytest.raises(TypeError):
+        plan.by_name["spam"] = foo
+
+    # Field names don't collide with the helpers of the compiled functions
+    @dataclass
+    class Eggs(betterproto.Message):
+        varint: int = betterproto.int32_field(1)
+        other: int = betterproto.int32_field(2)
+
+    plan = betterproto.message_plan(Eggs)
+    assert plan.by_name["other"].encode(300) == b"\x10\xac\x02"
+    assert plan.by_name["varint"].decode(b"\xac\x02", 0) == (300, 2)
+
+
+def test_lazy_parse():
+    @dataclass
+    class Leaf(betterproto.Message):
+        value: int = betterproto.int32_field(1)
+
+    @dataclass
+    class Branch(betterproto.Message):
+        leaf: Leaf = betterproto.message_field(1)
+        leaves: List[Leaf] = betterproto.message_field(2)
+
+    @dataclass(eq=False, repr=False)
+    class Tree(betterproto.Message):
+        branch: Branch = betterproto.message_field(1, group="part")
+        name: str = betterproto.string_field(2, group="part")
+
+    # The value of the leaf uses a non-canonical (padded) varint
+    leaf = b"\x08\x81\x80\x80\x80\x00"
+    branch = b"\n\x06" + leaf + b"\x12\x02\x08\x02"
+    data = b"\n\x0c" + branch
+
+    tree = Tree().parse(data, lazy=True)
+    assert bytes(tree) == data
+    assert len(tree) == len(data)
+    assert betterproto.which_one_of(tree, "part")[0] == "branch"
+    assert tree.branch.leaves == [Leaf(value=2)]
+    # The leaf hasn't been accessed yet
+    assert bytes(tree) == data
+    assert tree.branch.leaf.value == 1
+    assert bytes(tree) == bytes(Tree().parse(data)) != data
+    assert Tree().parse(data, lazy=True) == Tree().parse(data)
+
+    # Errors are raised when the field is accessed
+    tree = Tree().parse(b"\n\x02\n\x05", lazy=True)
+    with pytest.raises(ValueError):
+        tree.branch
+
+
+def test_lazy_message_class():
+    @dataclass
+    class Blob(betterproto.Message, lazy=True):
+        data: bytes = betterproto.bytes_field(1)
+
+    @dataclass
+    class Container(betterproto.Message):
+        blob: Blob = betterproto.message_field(1)
+        blobs: List[Blob] = betterproto.message_field(2)
+
+    data = bytes(Container(blob=Blob(b"spam"), blobs=[Blob(b"eggs")]))
+    container = Container().parse(data)
+    assert container.__dict__["blobs"] == [Blob(b"eggs")]
+    assert not isinstance(container.__dict__["blob"], Blob)
+    assert bytes(container) == data
+    assert container.blob == Blob(b"spam")
+
+
+def test_parse_only():
+    @dataclass
+    class Payload(betterproto.Message):
+        id: int = betterproto.int32_field(1)
+        blob: bytes = betterproto.bytes_field(2)
+
+    @dataclass
+    class Record(betterproto.Message):
+        header: str = betterproto.string_field(1)
+        payload: Payload = betterproto.message_field(2)
+        items: List[Payload] = betterproto.message_field(3)
+        count: int = betterproto.int32_field(4)
+
+    record = Record("header", Payload(1, b"blob"), [Payload(2, b"item")], 3)
+    # Followed by an unknown field
+    data = bytes(record) + b"\x28\x01"
+
+    parsed = Record().parse(data, only={"header", "payload.id", "items.id"})
+    assert parsed == Record("header", Payload(1), [Payload(2)])
+    assert parsed._unknown_fields == b"\x28\x01"
+
+    parsed = Record().parse(data, only=["payload", "payload.id"])
+    assert parsed == Record(payload=Payload(1, b"blob"))
+
+    # The skipped fields are serialized again after the parsed ones
+    parsed = Record().parse(data, only={"payload.id"}, keep_skipped=True)
+    assert parsed == Record(payload=Payload(1))
+    assert Record().parse(bytes(parsed)) == Record().parse(data)
+
+    for only in ({"spam"}, {"header.spam"}, {"payload.spam"}):
+        with pytest.raises(ValueError):
+            Record().parse(data, only=only)
+
+
+def test_parse_zero_copy():
+    @dataclass
+    class Blob(betterproto.Message):
+        data: bytes = betterproto.bytes_field(1)
+        parts: List[bytes] = betterproto.bytes_field(2)
+        by_name: Dict[str, bytes] = betterproto.map_field(
+            3, betterproto.TYPE_STRING, betterproto.TYPE_BYTES
+        )
+
+    @dataclass
+    class Container(betterproto.Message):
+        blob: Blob = betterproto.message_field(1)
+
+    container = Container(Blob(b"data", [b"part"], {"name": b"value"}))
+    buffer = bytearray(bytes(container))
+
+    parsed = Container().parse(buffer, zero_copy=True)
+    assert parsed == container
+    assert isinstance(parsed.blob.data, memoryview)
+    assert isinstance(parsed.blob.parts[0], memoryview)
+    assert isinstance(parsed.blob.by_name["name"], memoryview)
+    assert bytes(parsed) == buffer
+
+    # The values are views of the buffer
+    buffer[buffer.index(b"data")] = ord("D")
+    assert parsed.blob.data == b"Data"
+    with pytest.raises(BufferError):
+        buffer.append(0)
+
+    lazy = Container().parse(bytes(container), zero_copy=True, lazy=True)
+    assert isinstance(lazy.blob.data, memoryview)
+
+
+def test_serialize_bytes_buffers():
+    @dataclass
+    class Blob(betterproto.Message):
+        data: bytes = betterproto.bytes_field(1)
+        parts: List[bytes] = betterproto.bytes_field(2)
+        optional: Optional[bytes] = betterproto.bytes_field(3, optional=True)
+
+    expected = bytes(Blob(b"data", [b"part"], b"optional"))
+    blob = Blob(memoryview(b"data"), [bytearray(b"part")], memoryview(b"optional"))
+    assert bytes(blob) == expected
+    assert len(blob) == len(expected)
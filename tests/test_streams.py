@@ -1,13 +1,26 @@
+import asyncio
+import os
 from dataclasses import dataclass
 from io import BytesIO
 from pathlib import Path
 from shutil import which
 from subprocess import run
-from typing import Optional
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
 
 import pytest
 
 import betterproto
+from betterproto.stream import (
+    AsyncDelimitedReader,
+    DelimitedFile,
+    DelimitedReader,
+    DelimitedWriter,
+    parallel_load,
+)
 from tests.output_betterproto import (
     map,
     nested,
@@ -56,6 +69,52 @@ def test_load_varint_too_long():
         betterproto.load_varint(stream)
 
 
+def test_decode_varint():
+    assert betterproto.decode_varint(b"\x01", 0) == (1, 1)
+    assert betterproto.decode_varint(b"\x00\xac\x02", 1) == (300, 3)
+    assert betterproto.decode_varint(memoryview(b"\x95\x9A\xEF\x3A"), 0) == (
+        123456789,
+        4,
+    )
+    assert betterproto.decode_varint(betterproto.encode_varint(-1), 0) == (
+        (1 << 64) - 1,
+        10,
+    )
+
+    with pytest.raises(ValueError):
+        betterproto.decode_varint(b"\x80" * 10 + b"\x01", 0)
+
+    for cutoff in (b"\x80", b"\x80\x80\x80"):
+        with pytest.raises(EOFError):
+            betterproto.decode_varint(cutoff, 0)
+
+
+def test_encode_varint():
+    assert betterproto.encode_varint(0) == b"\x00"
+    assert betterproto.encode_varint(127) == b"\x7f"
+    assert betterproto.encode_varint(300) == b"\xac\x02"
+    assert betterproto.encode_varint((1 << 14) - 1) == b"\xff\x7f"
+    assert betterproto.encode_varint(1 << 14) == b"\x80\x80\x01"
+    assert betterproto.encode_varint(-1) == b"\xff" * 9 + b"\x01"
+    for value in (0, 1, 300, (1 << 14) - 1, 1 << 14, 1 << 63, -1, -(1 << 63)):
+        encoded = betterproto.encode_varint(value)
+        assert len(encoded) == betterproto.size_varint(value)
+        assert betterproto.decode_varint(encoded, 0) == (
+            value % (1 << 64),
+            len(encoded),
+        )
+
+    with pytest.raises(ValueError):
+        betterproto.encode_varint(-(1 << 63) - 1)
+
+
+def test_zigzag():
+    edge = -(1 << 63)
+    for value, encoded in ((0, 0), (-1, 1), (1, 2), (-2, 3), (edge, (1 << 64) - 1)):
+        assert betterproto.encode_zigzag(value) == encoded
+        assert betterproto.decode_zigzag(encoded) == value
+
+
 def test_load_varint_file():
     with open(streams_path / "message_dump_file_single.expected", "rb") as stream:
         assert betterproto.load_varint(stream) == (8, b"\x08")  # Single-byte varint
@@ -105,6 +164,15 @@ def test_parse_fields():
             assert field == next(parsed_stream)
 
 
+def test_parse_fields_wire_types():
+    data = b"\x08\x96\x01\x11" + bytes(8) + b"\x1a\x03abc\x25" + bytes(4)
+    fields = list(betterproto.parse_fields(data))
+    assert [(f.number, f.wire_type) for f in fields] == [(1, 0), (2, 1), (3, 2), (4, 5)]
+    assert [f.value for f in fields] == [150, bytes(8), b"abc", bytes(4)]
+    assert b"".join(f.raw for f in fields) == data
+    assert fields == list(betterproto.load_fields(BytesIO(data)))
+
+
 def test_message_dump_file_single(tmp_path):
     # Write the message to the stream
     with open(tmp_path / "message_dump_file_single.out", "wb") as stream:
@@ -143,6 +211,322 @@ def test_message_dump_delimited(tmp_path):
         assert test_stream.read() == exp_stream.read()
 
 
+class CountingStream(BytesIO):
+    writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super().write(data)
+
+
+class RawStream(BytesIO):
+    """A raw stream writing at most ``limit`` bytes at once."""
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+
+    def write(self, data):
+        return super().write(bytes(data[: self.limit]))
+
+
+def test_delimited_writer_partial_writes():
+    stream = RawStream(3)
+    with DelimitedWriter(stream) as writer:
+        writer.write_all([oneof_example, nested_example])
+    expected = BytesIO()
+    oneof_example.dump(expected, betterproto.SIZE_DELIMITED)
+    nested_example.dump(expected, betterproto.SIZE_DELIMITED)
+    assert stream.getvalue() == expected.getvalue()
+
+    # A stream which doesn't accept any data fails instead of looping forever
+    writer = DelimitedWriter(RawStream(0))
+    writer.write(oneof_example)
+    with pytest.raises(OSError):
+        writer.flush()
+
+
+def test_delimited_writer(tmp_path):
+    with open(tmp_path / "delimited_writer.out", "wb") as stream:
+        with DelimitedWriter(stream) as writer:
+            assert writer.write(oneof_example) == len_oneof + 1
+            writer.write_all([oneof_example, nested_example])
+
+    with open(tmp_path / "delimited_writer.out", "rb") as test_stream, open(
+        streams_path / "delimited_messages.in", "rb"
+    ) as exp_stream:
+        assert test_stream.read() == exp_stream.read()
+
+
+def test_delimited_writer_flush():
+    stream = CountingStream()
+    writer = DelimitedWriter(stream, flush_threshold=3 * (len_oneof + 1))
+    writer.write_all([oneof_example] * 5)
+    # The first three messages are written together
+    assert stream.writes == 1
+    assert writer.buffered == 2 * (len_oneof + 1)
+
+    writer.flush()
+    assert stream.writes == 2
+    assert writer.buffered == 0
+    writer.flush()
+    assert stream.writes == 2
+
+    expected = BytesIO()
+    for _ in range(5):
+        oneof_example.dump(expected, betterproto.SIZE_DELIMITED)
+    assert stream.getvalue() == expected.getvalue()
+
+
+def test_delimited_file(tmp_path):
+    messages = [oneof.Test(pitied=i, bar_name="x" * i) for i in range(200)]
+    with open(tmp_path / "records.bin", "wb") as stream:
+        with DelimitedWriter(stream) as writer:
+            writer.write_all(messages)
+
+    with DelimitedFile(tmp_path / "records.bin", oneof.Test) as records:
+        assert len(records) == 200
+        assert records[0] == messages[0]
+        assert records[150] == messages[150]
+        assert records[-1] == messages[-1]
+        assert records[10:13] == messages[10:13]
+        assert records[::-50] == messages[::-50]
+        assert list(records) == messages
+        with records.raw(7) as raw:
+            assert raw == bytes(messages[7])
+        with pytest.raises(IndexError):
+            records[200]
+
+
+def test_delimited_file_index(tmp_path):
+    path = tmp_path / "records.bin"
+    index_path = tmp_path / "records.idx"
+    with open(path, "wb") as stream, DelimitedWriter(stream) as writer:
+        writer.write_all([oneof_example, nested_example, oneof_example])
+
+    with DelimitedFile(path, oneof.Test, index_path=index_path) as records:
+        assert len(records) == 3
+    index = index_path.read_bytes()
+    # The size and modification time of the file, and the offsets
+    assert len(index) == 2 * 8 + 4 * 8
+
+    # The saved index is used, and recreated once the file changes
+    with DelimitedFile(path, oneof.Test, index_path=index_path) as records:
+        assert records[2] == oneof_example
+    with open(path, "ab") as stream:
+        oneof_example.dump(stream, betterproto.SIZE_DELIMITED)
+    with DelimitedFile(path, oneof.Test, index_path=index_path) as records:
+        assert len(records) == 4
+        assert records[3] == oneof_example
+    assert index_path.read_bytes()[2 * 8 : len(index) - 8] == index[2 * 8 : -8]
+
+    # Including when it is rewritten with the same size, in another order
+    mtime = path.stat().st_mtime_ns
+    with open(path, "wb") as stream, DelimitedWriter(stream) as writer:
+        writer.write_all([nested_example, oneof_example, oneof_example, oneof_example])
+    os.utime(path, ns=(mtime, mtime + 1_000_000_000))
+    with DelimitedFile(path, oneof.Test, index_path=index_path) as records:
+        assert records[1:] == [oneof_example] * 3
+
+
+def test_delimited_file_close(tmp_path):
+    # Records with unknown fields don't keep references to the mapped file.
+    data = bytes(oneof_example) + b"\x80\x01\x01"
+    with open(tmp_path / "records.bin", "wb") as stream:
+        stream.write(betterproto.encode_varint(len(data)) + data)
+
+    records = DelimitedFile(tmp_path / "records.bin", oneof.Test)
+    message = records[0]
+    records.close()
+    assert message._unknown_fields == b"\x80\x01\x01"
+    assert bytes(message) == data
+
+
+def test_delimited_file_invalid(tmp_path):
+    (tmp_path / "empty.bin").write_bytes(b"")
+    with DelimitedFile(tmp_path / "empty.bin", oneof.Test) as records:
+        assert len(records) == 0
+        assert list(records) == []
+
+    stream = BytesIO()
+    oneof_example.dump(stream, betterproto.SIZE_DELIMITED)
+    (tmp_path / "truncated.bin").write_bytes(stream.getvalue()[:-1])
+    with pytest.raises(ValueError):
+        DelimitedFile(tmp_path / "truncated.bin", oneof.Test)
+
+
+def test_delimited_file_index_error(tmp_path, monkeypatch):
+    # The file is closed if its index can't be saved
+    closed = []
+    close = DelimitedFile.close
+    monkeypatch.setattr(DelimitedFile, "close", lambda self: closed.append(close(self)))
+    path = tmp_path / "records.bin"
+    with open(path, "wb") as stream:
+        oneof_example.dump(stream, betterproto.SIZE_DELIMITED)
+    with pytest.raises(FileNotFoundError):
+        DelimitedFile(path, oneof.Test, index_path=tmp_path / "missing" / "records.idx")
+    assert len(closed) == 1
+
+
+def test_parallel_load(tmp_path):
+    path = tmp_path / "records.bin"
+    messages = [oneof.Test(pitied=i, bar_name="x" * (i % 50)) for i in range(500)]
+    with open(path, "wb") as stream, DelimitedWriter(stream) as writer:
+        writer.write_all(messages)
+
+    assert list(parallel_load(path, oneof.Test, 2, shard_size=1000)) == messages
+    # Only the results of the function are sent back from the workers
+    unordered = parallel_load(path, oneof.Test, 2, ordered=False, func=bytes)
+    assert sorted(unordered) == sorted(bytes(message) for message in messages)
+
+    (tmp_path / "empty.bin").write_bytes(b"")
+    assert list(parallel_load(tmp_path / "empty.bin", oneof.Test, 2)) == []
+
+
+class AsyncWriter:
+    """The methods of :class:`asyncio.StreamWriter` used to dump messages."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.drained = 0
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        self.drained += 1
+
+
+@pytest.mark.asyncio
+async def test_message_dump_load_async():
+    writer = AsyncWriter()
+    await oneof_example.dump_async(writer, betterproto.SIZE_DELIMITED)
+    await nested_example.dump_async(writer, betterproto.SIZE_DELIMITED)
+    await oneof_example.dump_async(writer)
+    assert writer.drained == 3
+
+    reader = asyncio.StreamReader()
+    reader.feed_data(bytes(writer.data))
+    reader.feed_eof()
+    message = await oneof.Test().load_async(reader, betterproto.SIZE_DELIMITED)
+    assert message == oneof_example
+    message = await nested.Test().load_async(reader, betterproto.SIZE_DELIMITED)
+    assert message == nested_example
+    assert await oneof.Test().load_async(reader) == oneof_example
+    with pytest.raises(EOFError):
+        await oneof.Test().load_async(reader, betterproto.SIZE_DELIMITED)
+
+    reader = asyncio.StreamReader()
+    reader.feed_data(bytes(oneof_example)[:-1])
+    reader.feed_eof()
+    with pytest.raises(ValueError):
+        await oneof.Test().load_async(reader, len_oneof)
+
+
+@pytest.mark.asyncio
+async def test_async_delimited_reader():
+    stream = BytesIO()
+    for _ in range(3):
+        oneof_example.dump(stream, betterproto.SIZE_DELIMITED)
+    data = stream.getvalue()
+
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    messages = [message async for message in AsyncDelimitedReader(reader, oneof.Test)]
+    assert messages == [oneof_example] * 3
+
+    for end in (len(data) - 1, len(data) - len_oneof):
+        reader = asyncio.StreamReader()
+        reader.feed_data(data[:end])
+        reader.feed_eof()
+        with pytest.raises(ValueError):
+            async for _ in AsyncDelimitedReader(reader, oneof.Test):
+                pass
+
+
+def test_message_stream_writer():
+    stream = BytesIO()
+    with repeatedpacked.Test.stream_writer(stream) as writer:
+        writer.extend("counts", [1, 2])
+        writer.write_field("signed", [-1, 2, -3])
+        writer.append("counts", 3)
+        writer.extend("fixed", [1.2, -2.3, 3.4])
+        assert stream.getvalue() == b""
+    assert repeatedpacked.Test().parse(stream.getvalue()) == packed_example
+
+    stream = BytesIO()
+    with nested.Test.stream_writer(stream) as writer:
+        writer.write_field("nested", nested_example.nested)
+        writer.write_field("sibling", nested_example.sibling)
+        writer.write_field("sibling2", nested_example.sibling2)
+        writer.write_field("msg", nested_example.msg)
+    assert stream.getvalue() == bytes(nested_example)
+
+    stream = BytesIO()
+    with map.Test.stream_writer(stream) as writer:
+        writer.append("counts", ("blah", 1))
+        writer.append("counts", ("Blah2", 2))
+    assert stream.getvalue() == bytes(map_example)
+
+    with pytest.raises(ValueError):
+        writer.write_field("missing", 1)
+    with pytest.raises(ValueError):
+        nested.Test.stream_writer(stream).append("msg", nested.TestMsg.THIS)
+
+
+def test_message_stream_writer_bounded():
+    stream = CountingStream()
+    writer = repeated.Test.stream_writer(stream)
+    writer.flush_threshold = 100
+    for i in range(1000):
+        writer.append("names", str(i))
+        assert writer.buffered < 100
+    writer.flush()
+    assert stream.writes > 10
+    assert repeated.Test().parse(stream.getvalue()).names == [
+        str(i) for i in range(1000)
+    ]
+
+    stream = CountingStream()
+    writer = repeatedpacked.Test.stream_writer(stream)
+    writer.flush_threshold = 100
+    writer.extend("counts", range(1000))
+    writer.flush()
+    assert repeatedpacked.Test().parse(stream.getvalue()).counts == list(range(1000))
+
+
+def test_message_iter_repeated():
+    @dataclass
+    class Item(betterproto.Message):
+        id: int = betterproto.int32_field(1)
+
+    @dataclass
+    class Response(betterproto.Message):
+        header: str = betterproto.string_field(1)
+        items: List[Item] = betterproto.message_field(2)
+        ids: List[int] = betterproto.int32_field(3)
+
+    response = Response("header", [Item(i) for i in range(100)], [1, 2, 3])
+    data = bytes(response)
+    for source in (data, memoryview(data), BytesIO(data)):
+        rest = Response()
+        assert list(Response.iter_repeated(source, "items", rest)) == response.items
+        assert rest == Response("header", ids=[1, 2, 3])
+
+    # Values of packed fields may be packed in multiple blocks or not be packed
+    data = b"\x1a\x02\x01\x02\x18\x03\x1a\x01\x04"
+    assert list(Response.iter_repeated(data, "ids")) == [1, 2, 3, 4]
+    assert list(Response.iter_repeated(BytesIO(data), "ids")) == [1, 2, 3, 4]
+
+    with pytest.raises(ValueError):
+        list(Response.iter_repeated(bytes(response)[:-1], "items"))
+    with pytest.raises(ValueError):
+        Response.iter_repeated(data, "header")
+    with pytest.raises(ValueError):
+        Response.iter_repeated(data, "missing")
+
+
 def test_message_len():
     assert len_oneof == len(bytes(oneof_example))
     assert len(nested_example) == len(bytes(nested_example))
@@ -171,6 +555,53 @@ def test_message_load_too_small():
         oneof.Test().load(stream, len_oneof - 1)
 
 
+def test_message_parse_buffer_types():
+    data = bytes(nested_example)
+    assert nested.Test().parse(bytearray(data)) == nested_example
+    assert nested.Test().parse(memoryview(data)) == nested_example
+    assert (
+        nested.Test().parse(memoryview(b"\x00" + data + b"\x00")[1:-1])
+        == nested_example
+    )
+
+
+def test_message_serialize_append():
+    buffer = bytearray(b"\x00")
+    assert oneof_example.serialize_append(buffer) == len_oneof
+    assert nested_example.serialize_append(buffer) == len(nested_example)
+    assert buffer == b"\x00" + bytes(oneof_example) + bytes(nested_example)
+
+
+def test_message_serialize_into():
+    data = bytes(oneof_example)
+
+    buffer = bytearray(b"abc")
+    assert oneof_example.serialize_into(buffer, 1) == len_oneof
+    assert buffer == b"a" + data
+
+    view = memoryview(bytearray(len_oneof + 2))
+    assert oneof_example.serialize_into(view, 1) == len_oneof
+    assert view.tobytes() == b"\x00" + data + b"\x00"
+
+    with pytest.raises(ValueError):
+        oneof_example.serialize_into(view, 3)
+    with pytest.raises(ValueError):
+        oneof_example.serialize_into(bytearray(), 1)
+
+    # Views of other formats are written to byte-wise
+    buffer = bytearray(4 * len_oneof)
+    view = memoryview(buffer).cast("I")
+    assert oneof_example.serialize_into(view, 2 * len_oneof) == len_oneof
+    assert buffer[2 * len_oneof : 3 * len_oneof] == data
+    with pytest.raises(ValueError):
+        oneof_example.serialize_into(view, 3 * len_oneof + 1)
+
+    # Nested messages are written in place after their size
+    buffer = bytearray(b"x" * (len(nested_example) + 2))
+    assert nested_example.serialize_into(buffer, 1) == len(nested_example)
+    assert buffer == b"x" + bytes(nested_example) + b"x"
+
+
 def test_message_load_delimited():
     with open(streams_path / "delimited_messages.in", "rb") as stream:
         assert oneof.Test().load(stream, betterproto.SIZE_DELIMITED) == oneof_example
@@ -179,6 +610,47 @@ def test_message_load_delimited():
         assert stream.read(1) == b""
 
 
+class ShortReadStream(BytesIO):
+    """A stream returning at most 3 bytes per read, like a socket."""
+
+    def read(self, size=-1):
+        return super().read(min(size, 3) if size >= 0 else 3)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 1 << 16])
+def test_delimited_reader(chunk_size):
+    messages = [
+        oneof_example,
+        oneof.Test(bar_name="x" * 300),  # Size varint of two bytes
+        oneof.Test(),  # Empty message
+        oneof_example,
+    ]
+    stream = BytesIO()
+    for message in messages:
+        message.dump(stream, betterproto.SIZE_DELIMITED)
+    data = stream.getvalue()
+
+    reader = DelimitedReader(BytesIO(data), oneof.Test, chunk_size=chunk_size)
+    assert list(reader) == messages
+    assert list(reader) == []
+
+    reader = DelimitedReader(ShortReadStream(data), oneof.Test, chunk_size)
+    assert list(reader) == messages
+
+
+def test_delimited_reader_truncated():
+    stream = BytesIO()
+    oneof_example.dump(stream, betterproto.SIZE_DELIMITED)
+    oneof_example.dump(stream, betterproto.SIZE_DELIMITED)
+    data = stream.getvalue()
+
+    for end in (len(data) - 1, len(data) - len_oneof):
+        reader = DelimitedReader(BytesIO(data[:end]), oneof.Test, chunk_size=4)
+        assert next(reader) == oneof_example
+        with pytest.raises(ValueError):
+            next(reader)
+
+
 def test_message_load_too_large():
     with open(
         streams_path / "message_dump_file_single.expected", "rb"
@@ -218,6 +690,32 @@ def test_message_len_empty_string():
     assert len(empty) == len(bytes(empty))
 
 
+def test_message_len_nested_sizes():
+    @dataclass
+    class Leaf(betterproto.Message):
+        text: str = betterproto.string_field(1)
+        values: List[int] = betterproto.sint64_field(2)
+
+    @dataclass
+    class Tree(betterproto.Message):
+        leaf: Leaf = betterproto.message_field(1)
+        leaves: List[Leaf] = betterproto.message_field(2)
+        by_name: Dict[str, Leaf] = betterproto.map_field(
+            3, betterproto.TYPE_STRING, betterproto.TYPE_MESSAGE
+        )
+
+    # Non-ASCII text, the same instance in several places and a length prefix
+    # spanning multiple bytes.
+    shared = Leaf(text="grüße", values=[-1, 300])
+    tree = Tree(
+        leaf=Leaf(text="x" * 200),
+        leaves=[shared, Leaf(), shared],
+        by_name={"a": shared, "b": Leaf()},
+    )
+    assert len(tree) == len(bytes(tree)) == len(bytes(Tree().parse(bytes(tree))))
+    assert Tree().parse(bytes(tree)) == tree
+
+
 def test_calculate_varint_size_negative():
     single_byte = -1
     multi_byte = -10000000
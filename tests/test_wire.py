@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    List,
+)
+
+import pytest
+
+import betterproto
+from betterproto import wire
+
+
+@dataclass
+class Key(betterproto.Message):
+    id: int = betterproto.sint32_field(1)
+    name: str = betterproto.string_field(2)
+    data: bytes = betterproto.bytes_field(3)
+    weights: List[float] = betterproto.double_field(4)
+    labels: Dict[str, int] = betterproto.map_field(
+        5, betterproto.TYPE_STRING, betterproto.TYPE_INT32
+    )
+
+
+@dataclass
+class Header(betterproto.Message):
+    key: Key = betterproto.message_field(1)
+
+
+@dataclass
+class Record(betterproto.Message):
+    header: Header = betterproto.message_field(1)
+    body: bytes = betterproto.bytes_field(2)
+
+
+record = Record(
+    Header(Key(-5, "key", b"data", [1.5, 2.5], {"a": 1})),
+    b"body",
+)
+data = bytes(record)
+
+
+def test_extract():
+    assert wire.extract(data, Record, "header.key.id") == -5
+    assert wire.extract(data, Record, "header.key.name") == "key"
+    assert wire.extract(data, Record, "header.key.weights") == [1.5, 2.5]
+    assert wire.extract(data, Record, "header.key.labels") == {"a": 1}
+
+    body = wire.extract(data, Record, "body")
+    assert isinstance(body, memoryview)
+    assert body == b"body"
+    assert wire.extract(bytearray(data), Record, "header.key.data") == b"data"
+    assert Key().parse(wire.extract(data, Record, "header.key")) == record.header.key
+
+
+def test_extract_missing_field():
+    assert wire.extract(b"", Record, "header.key.id") is None
+    assert wire.extract(bytes(Record(body=b"body")), Record, "header.key") is None
+
+
+def test_extract_last_value_wins():
+    # The same field sent twice, in separate occurrences of its parent message
+    first = bytes(Record(Header(Key(id=1, name="first"))))
+    second = bytes(Record(Header(Key(id=2))))
+    assert wire.extract(first + second, Record, "header.key.id") == 2
+    assert wire.extract(first + second, Record, "header.key.name") == "first"
+
+
+def test_extract_truncated_data():
+    # Cut off in a tag, in a length prefix and in a length-delimited value
+    for truncated in (b"\x8a", b"\x0a\x80", data[:-1]):
+        with pytest.raises(ValueError, match="Unexpected end of data"):
+            wire.extract(truncated, Record, "body")
+
+
+def test_compile_path():
+    extractor = wire.compile_path(Record, "header.key.id")
+    assert wire.compile_path(Record, "header.key.id") is extractor
+    assert extractor(data) == -5
+    assert extractor(memoryview(data)) == -5
+
+    for path in ("spam", "body.spam", "header.key.weights.spam"):
+        with pytest.raises(ValueError):
+            wire.compile_path(Record, path)